@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures memory taken by a redditor's posts when they are loaded - as
+objects with a per-instance dict (as posts were before they used
+slots), as Comment and Submission objects with slots, and in columnar
+stores.
+
+Each way is measured in a process of its own, from the growth of the
+process's resident size (read from /proc, so Linux only).
+
+Usage:
+  python benchmarks/memory.py [-c comments] [-s submissions]
+
+"""
+
+import os
+import gc
+import sys
+import json
+import getopt
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ["dict", "slots", "columnar"]
+
+
+class DictPost(object):
+  """
+  A post that keeps its attributes in a per-instance dict.
+
+  """
+
+  def __init__(self, post, permalink=None):
+    for cls in type(post).__mro__:
+      for attribute in getattr(cls, "__slots__", ()):
+        setattr(self, attribute, getattr(post, attribute))
+    if permalink:
+      # Comments stored their permalinks before they used slots
+      self.permalink = permalink
+
+
+def resident_size():
+  """
+  Returns resident size of this process in bytes.
+
+  """
+
+  with open("/proc/self/statm") as f:
+    pages = int(f.read().split()[1])
+  return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(mode, path):
+  """
+  Loads posts from given file in one of MODES and prints the memory
+  they take.
+
+  """
+
+  # reddit_user reads subreddits.csv from the working directory
+  os.chdir(ROOT)
+  from reddit_user import UserData, CommentStore, SubmissionStore
+
+  if mode == "dict":
+    comments, submissions = [], []
+    add_comment = lambda c: comments.append(DictPost(c, c.permalink))
+    add_submission = lambda s: submissions.append(DictPost(s))
+  elif mode == "slots":
+    comments, submissions = [], []
+    add_comment, add_submission = comments.append, submissions.append
+  else:
+    comments, submissions = CommentStore(), SubmissionStore()
+    add_comment, add_submission = comments.append, submissions.append
+
+  gc.collect()
+  before = resident_size()
+  with open(path) as f:
+    for line in f:
+      kind, data = json.loads(line)
+      if kind == "comment":
+        add_comment(UserData.parse_comment(data))
+      else:
+        add_submission(UserData.parse_submission(data))
+  gc.collect()
+  size = resident_size() - before
+
+  posts = len(comments) + len(submissions)
+  print "%-10s %8d posts %10.1f MB %8d bytes/post" % (
+    mode, posts, size / 1024.0 / 1024, size / posts
+  )
+
+
+def benchmark(comments=50000, submissions=10000):
+  """
+  Measures memory taken by posts of a synthetic redditor in each of
+  MODES.
+
+  """
+
+  from fake_reddit import synthetic_user
+
+  user = synthetic_user("memory", comments, submissions)
+  fd, path = tempfile.mkstemp(suffix=".ndjson")
+  try:
+    with os.fdopen(fd, "w") as f:
+      for comment in user["comments"]:
+        f.write(json.dumps(["comment", comment]) + "\n")
+      for submission in user["submissions"]:
+        f.write(json.dumps(["submission", submission]) + "\n")
+    del user
+    for mode in MODES:
+      subprocess.check_call(
+        [sys.executable, os.path.abspath(__file__), "-m", mode, path]
+      )
+  finally:
+    os.remove(path)
+
+
+if __name__ == "__main__":
+  opts, args = getopt.getopt(sys.argv[1:], "c:s:m:")
+  opts = dict(opts)
+  if "-m" in opts:
+    measure(opts["-m"], args[0])
+  else:
+    benchmark(
+      comments=int(opts.get("-c", 50000)),
+      submissions=int(opts.get("-s", 10000))
+    )
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Times TextSanitizer against the implementation of Util.sanitize_text it
+replaced, on generated comments.
+
+Usage:
+  python benchmarks/sanitizer.py [-n texts] [-r repeat]
+
+"""
+
+import os
+import sys
+import getopt
+import random
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from sanitizer import TextSanitizer
+from fake_reddit import SENTENCES
+from test_sanitizer import sanitize_text
+
+def benchmark(texts=2000, repeat=5):
+  r = random.Random(1)
+  comments = [
+    u" ".join(r.sample(SENTENCES, r.randint(1, 4))) for _ in xrange(texts)
+  ]
+  # Plain comments, with none of the parts that are removed
+  plain = [
+    u"I think this is great and I would do it again " * r.randint(1, 4)
+    for _ in xrange(texts)
+  ]
+  sanitizer = TextSanitizer()
+
+  for name, corpus in (("comments", comments), ("plain", plain)):
+    times = []
+    for sanitize in (sanitize_text, sanitizer.sanitize):
+      times.append(min(timeit.repeat(
+        lambda: [sanitize(text) for text in corpus], number=1, repeat=repeat
+      )))
+    print "%-10s %6d texts  before %7.1f us/text  after %7.1f us/text  " \
+      "%5.2fx" % (
+        name, len(corpus), times[0] / len(corpus) * 1e6,
+        times[1] / len(corpus) * 1e6, times[0] / times[1]
+      )
+
+
+if __name__ == "__main__":
+  opts, args = getopt.getopt(sys.argv[1:], "n:r:")
+  opts = dict(opts)
+  benchmark(texts=int(opts.get("-n", 2000)), repeat=int(opts.get("-r", 5)))
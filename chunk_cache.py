@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import json
+import hashlib
+from collections import OrderedDict
+
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+class ChunkCache(object):
+  """
+  Cache of POS tags and chunks extracted from sentences, keyed by a hash
+  of the sentence and the version of the tagger and chunker - so that
+  sentences seen before, for this or any other redditor, aren't tagged
+  and chunked again, and entries of other versions are never used.
+
+  Entries are kept in memory as JSON, bounded by number of entries, and
+  least recently used entries are evicted first. If a path is given,
+  entries are also stored in an SQLite database there, which may be
+  shared by several processes. New entries are written in batches; a
+  batch that finds the database busy is kept and written with the next
+  one.
+
+  """
+
+  MAX_ENTRIES = 20000
+  # Entries stored in the database before changes are committed
+  COMMIT_INTERVAL = 100
+  # Uncommitted entries kept while the database is busy - older ones
+  # are dropped beyond this
+  MAX_UNSAVED = 10000
+
+  def __init__(self, version, path=None, max_entries=None):
+    self.version = version
+    self.path = path
+    self.max_entries = max_entries or self.MAX_ENTRIES
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+    # Key -> JSON of entry, least recently used first
+    self.entries = OrderedDict()
+    self.db = None
+    # Key -> JSON of entries not yet stored in the database
+    self.unsaved = OrderedDict()
+    if path:
+      if not sqlite3:
+        raise ImportError("sqlite3 is required to store chunks in %s" % path)
+      self.db = sqlite3.connect(path, timeout=30)
+      self.db.execute("PRAGMA journal_mode=WAL")
+      self.db.execute(
+        "CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, value TEXT)"
+      )
+      self.db.commit()
+
+  def key(self, sentence):
+    """
+    Returns cache key for given sentence.
+
+    """
+
+    if isinstance(sentence, unicode):
+      sentence = sentence.encode("utf-8")
+    return hashlib.sha1(self.version + "\0" + sentence).hexdigest()
+
+  def get(self, sentence):
+    """
+    Returns (tags, chunks) of given sentence, or None if it is not
+    cached.
+
+    """
+
+    key = self.key(sentence)
+    value = self.entries.pop(key, None)
+    if value is None:
+      value = self.unsaved.get(key)
+    if value is None and self.db:
+      row = self.db.execute(
+        "SELECT value FROM chunks WHERE key = ?", (key,)
+      ).fetchone()
+      if row:
+        value = row[0]
+        self.remember(key, value)
+    if value is None:
+      self.misses += 1
+      return None
+    self.entries[key] = value
+    self.hits += 1
+    entry = json.loads(value)
+    return entry["tags"], entry["chunks"]
+
+  def set(self, sentence, tags, chunks):
+    """
+    Stores tags and chunks of given sentence.
+
+    """
+
+    key = self.key(sentence)
+    value = json.dumps({"tags" : tags, "chunks" : chunks})
+    self.remember(key, value)
+    if self.db:
+      self.unsaved.pop(key, None)
+      self.unsaved[key] = value
+      while len(self.unsaved) > self.MAX_UNSAVED:
+        self.unsaved.popitem(last=False)
+      if len(self.unsaved) % self.COMMIT_INTERVAL == 0:
+        self.commit()
+
+  def remember(self, key, value):
+    """
+    Keeps entry in memory, evicting least recently used entries if the
+    cache is full.
+
+    """
+
+    self.entries.pop(key, None)
+    self.entries[key] = value
+    while len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def commit(self):
+    """
+    Writes unsaved entries to the database. Returns False if the
+    database is busy, in which case the entries are kept for the next
+    commit.
+
+    """
+
+    if not self.db or not self.unsaved:
+      return True
+    try:
+      self.db.executemany(
+        "INSERT OR REPLACE INTO chunks VALUES (?, ?)",
+        self.unsaved.iteritems()
+      )
+      self.db.commit()
+    except sqlite3.OperationalError:
+      self.db.rollback()
+      return False
+    self.unsaved.clear()
+    return True
+
+  def close(self):
+    """
+    Writes unsaved entries and closes the database - entries are lost
+    if the database is still busy.
+
+    """
+
+    if self.db:
+      self.commit()
+      self.db.close()
+      self.db = None
+
+  def stats(self):
+    """
+    Returns cache statistics.
+
+    """
+
+    lookups = self.hits + self.misses
+    return {
+      "hits" : self.hits,
+      "misses" : self.misses,
+      "evictions" : self.evictions,
+      "entries" : len(self.entries),
+      "hit_rate" : round(self.hits / (lookups * 1.0 or 1), 2)
+    }
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from urlparse import urlparse
+
+def url_path(url):
+  """
+  Returns path of given URL, as urlparse(url).path does.
+
+  Plain http and https URLs are split directly, other URLs go through
+  urlparse.
+
+  """
+
+  if url.startswith("http://"):
+    start = 7
+  elif url.startswith("https://"):
+    start = 8
+  else:
+    return urlparse(url).path
+  if "[" in url or "]" in url:
+    # IPv6 hosts, which urlparse validates
+    return urlparse(url).path
+
+  # Netloc runs up to the first /, ? or #
+  end = len(url)
+  for c in "/?#":
+    i = url.find(c, start)
+    if 0 <= i < end:
+      end = i
+  path = url[end:]
+
+  # Then fragment and query are split off
+  i = path.find("#")
+  if i >= 0:
+    path = path[:i]
+  i = path.find("?")
+  if i >= 0:
+    path = path[:i]
+
+  # And parameters of the last path segment
+  if ";" in path:
+    i = path.find(";", max(path.rfind("/"), 0))
+    if i >= 0:
+      path = path[:i]
+  return path
+
+
+class SubmissionClassifier(object):
+  """
+  Classifies submissions as "Self", "Image", "Video" or "Other" by
+  domain and URL.
+
+  Domains are matched against lists of domains by suffix, like
+  str.endswith - suffixes are looked up by length in sets rather than
+  compared one by one. Results are cached per domain, as most
+  submissions are to a few domains.
+
+  """
+
+  # Maximum number of domains in the cache before it is cleared
+  MAX_CACHED = 100000
+
+  def __init__(self, image_domains, video_domains, image_extensions):
+    self.image_domains = self.index(image_domains)
+    self.video_domains = self.index(video_domains)
+    self.image_extensions = tuple(image_extensions)
+    self.cache = {}
+
+  @staticmethod
+  def index(suffixes):
+    """
+    Returns dict of sets of suffixes keyed by length.
+
+    """
+
+    index = {}
+    for suffix in suffixes:
+      index.setdefault(len(suffix), set()).add(suffix)
+    return index
+
+  @staticmethod
+  def matches(domain, index):
+    """
+    Returns True if domain ends with one of the suffixes in index.
+
+    """
+
+    for length, suffixes in index.iteritems():
+      if len(domain) >= length and domain[len(domain) - length:] in suffixes:
+        return True
+    return False
+
+  def domain_type(self, domain):
+    """
+    Returns "Self", "Image" or "Video" if the type of submissions to
+    given domain follows from the domain alone, None otherwise.
+
+    """
+
+    domain_type = self.cache.get(domain, False)
+    if domain_type is False:
+      if domain.startswith("self."):
+        domain_type = "Self"
+      elif self.matches(domain, self.image_domains):
+        domain_type = "Image"
+      elif self.matches(domain, self.video_domains):
+        domain_type = "Video"
+      else:
+        domain_type = None
+      if len(self.cache) >= self.MAX_CACHED:
+        self.cache.clear()
+      self.cache[domain] = domain_type
+    return domain_type
+
+  def classify(self, submission):
+    """
+    Returns (type, name) of given submission - name is the subreddit
+    for self posts and the domain otherwise.
+
+    """
+
+    domain_type = self.domain_type(submission.domain)
+    if domain_type == "Self":
+      return "Self", submission.subreddit
+    elif domain_type == "Image" or \
+      url_path(submission.url).endswith(self.image_extensions):
+      return "Image", submission.domain
+    elif domain_type == "Video":
+      return "Video", submission.domain
+    return "Other", submission.domain
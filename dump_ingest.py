@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+"""
+Profiles many redditors from bulk archives of comments and submissions
+(newline-delimited JSON, optionally compressed with gzip, bz2 or zstd)
+in one sequential pass over the archives.
+
+Usage:
+  python dump_ingest.py -u usernames_file [-o output_dir] [-b] dump...
+
+"""
+
+import os
+import re
+import sys
+import bz2
+import gzip
+import json
+import math
+import zlib
+import getopt
+import shutil
+import hashlib
+import datetime
+import tempfile
+
+import pytz
+
+from reddit_user import RedditUser, UserData
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+class BloomFilter(object):
+  """
+  Bloom filter over strings - uses a fixed amount of memory for very
+  large sets, at the cost of occasional false positives.
+
+  """
+
+  def __init__(self, capacity, error_rate=0.001):
+    # Optimal number of bits and hash functions for given capacity and
+    # error rate
+    capacity = max(capacity, 1)
+    self.bits = max(
+      8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    )
+    self.hashes = max(1, int(round(self.bits * math.log(2) / capacity)))
+    self.array = bytearray(self.bits // 8 + 1)
+
+  def positions(self, value):
+    """
+    Returns bit positions for given value.
+
+    """
+
+    digest = hashlib.md5(value).hexdigest()
+    h1 = int(digest[:16], 16)
+    h2 = int(digest[16:], 16)
+    return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+  def add(self, value):
+    for p in self.positions(value):
+      self.array[p >> 3] |= 1 << (p & 7)
+
+  def __contains__(self, value):
+    return all(
+      self.array[p >> 3] & (1 << (p & 7)) for p in self.positions(value)
+    )
+
+
+class DumpIngest(object):
+  """
+  Extracts posts of a set of redditors from bulk archives and profiles
+  each of them.
+
+  Archives are read once, sequentially. Lines are matched against the
+  target usernames before being decoded - the author is picked out with
+  a regular expression and looked up in a set (or a Bloom filter, for
+  very large sets of usernames - authors that pass the filter are
+  confirmed against the usernames when partitions are read). Matching
+  lines are spilled to
+  partition files by author, and each partition is then grouped by
+  author in memory, so memory use is bounded by the largest partition
+  rather than the size of the archives.
+
+  """
+
+  # Number of partition files matching lines are spilled to
+  PARTITIONS = 64
+  # Bytes read at a time from archives
+  BLOCK_SIZE = 1024 * 1024
+
+  AUTHOR_PATTERN = re.compile(r'"author"\s*:\s*"([^"\\]+)"')
+
+  def __init__(self, usernames, bloom=False, error_rate=0.001, tmp_dir=None):
+    self.usernames = set(u.strip().lower() for u in usernames if u.strip())
+    if bloom:
+      self.targets = BloomFilter(len(self.usernames), error_rate)
+      for username in self.usernames:
+        self.targets.add(username)
+    else:
+      self.targets = self.usernames
+    self.tmp_dir = tmp_dir
+    self.lines = 0
+    self.matches = 0
+
+  @staticmethod
+  def open(path):
+    """
+    Opens an archive, decompressing it based on its extension.
+
+    """
+
+    if path.endswith(".gz"):
+      return gzip.open(path, "rb")
+    elif path.endswith(".bz2"):
+      return bz2.BZ2File(path, "rb")
+    elif path.endswith(".zst"):
+      if not zstandard:
+        raise ImportError("zstandard is required to read %s" % path)
+      return zstandard.ZstdDecompressor(
+        max_window_size=2 ** 31
+      ).stream_reader(open(path, "rb"))
+    else:
+      return open(path, "rb")
+
+  def read_lines(self, path):
+    """
+    Yields lines of an archive.
+
+    """
+
+    f = self.open(path)
+    try:
+      rest = ""
+      while True:
+        block = f.read(self.BLOCK_SIZE)
+        if not block:
+          break
+        lines = (rest + block).split("\n")
+        rest = lines.pop()
+        for line in lines:
+          yield line
+      if rest:
+        yield rest
+    finally:
+      f.close()
+
+  def spill(self, paths, spill_dir):
+    """
+    Writes lines of given archives by target authors to partition files
+    in spill_dir.
+
+    """
+
+    partitions = [
+      open(os.path.join(spill_dir, "%d" % i), "wb") \
+        for i in range(self.PARTITIONS)
+    ]
+    try:
+      for path in paths:
+        for line in self.read_lines(path):
+          self.lines += 1
+          match = self.AUTHOR_PATTERN.search(line)
+          if not match:
+            continue
+          author = match.group(1).lower()
+          if author in self.targets:
+            self.matches += 1
+            partition = zlib.crc32(author) % self.PARTITIONS
+            partitions[partition].write(line.strip() + "\n")
+    finally:
+      for f in partitions:
+        f.close()
+
+  @staticmethod
+  def user_data(username, records):
+    """
+    Returns a UserData built from a user's archived comments and
+    submissions.
+
+    Archives don't have the user's about data, so signup date is taken
+    to be the date of the earliest post and karma is the sum of scores.
+
+    """
+
+    data = UserData(username)
+    for record in records:
+      record["created_utc"] = float(record["created_utc"])
+      record.setdefault("gilded", 0)
+      record.setdefault("edited", False)
+      if "body" in record:
+        record.setdefault("parent_id", record.get("link_id", ""))
+        data.comments.append(UserData.parse_comment(record))
+      elif "title" in record:
+        record.setdefault(
+          "permalink", "/r/%s/comments/%s/" % (
+            record["subreddit"], record["id"]
+          )
+        )
+        record.setdefault("selftext", "")
+        record.setdefault("url", "")
+        record.setdefault("domain", "")
+        record.setdefault("is_self", record["domain"].startswith("self."))
+        data.submissions.append(UserData.parse_submission(record))
+
+    # Posts are expected newest first
+    data.comments.sort(key=lambda c: c.created_utc, reverse=True)
+    data.submissions.sort(key=lambda s: s.created_utc, reverse=True)
+
+    posts = data.comments + data.submissions
+    data.about = {
+      "created_utc" : datetime.datetime.fromtimestamp(
+        min(p.created_utc for p in posts), tz=pytz.utc
+      ),
+      "link_karma" : sum(s.score for s in data.submissions),
+      "comment_karma" : sum(c.score for c in data.comments),
+      "name" : username,
+      "reddit_id" : None,
+      "is_mod" : False
+    }
+    return data
+
+  def groups(self, paths):
+    """
+    Yields (username, json_data) for each target user found in given
+    archives, in the format accepted by RedditUser's json_data.
+
+    """
+
+    spill_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+    try:
+      self.spill(paths, spill_dir)
+      for i in range(self.PARTITIONS):
+        records = {}
+        with open(os.path.join(spill_dir, "%d" % i), "rb") as f:
+          for line in f:
+            record = json.loads(line)
+            # Skip false positives of a Bloom filter
+            if record.get("author") and \
+              record["author"].lower() in self.usernames:
+              records.setdefault(record["author"], []).append(record)
+        for username, user_records in records.iteritems():
+          yield (
+            username, self.user_data(username, user_records).to_json()
+          )
+    finally:
+      shutil.rmtree(spill_dir, ignore_errors=True)
+
+  def process(self, paths):
+    """
+    Yields (username, user, error) for each target user found in given
+    archives, where user is a RedditUser or None if processing failed
+    with error.
+
+    """
+
+    for username, json_data in self.groups(paths):
+      try:
+        user = RedditUser(username, json_data=json_data)
+      except Exception:
+        yield (username, None, sys.exc_info()[1])
+      else:
+        yield (username, user, None)
+
+
+if __name__ == "__main__":
+  opts, paths = getopt.getopt(sys.argv[1:], "u:o:b")
+  opts = dict(opts)
+  if "-u" not in opts or not paths:
+    print __doc__
+    sys.exit(2)
+
+  with open(opts["-u"]) as f:
+    ingest = DumpIngest(f, bloom="-b" in opts)
+
+  output_dir = opts.get("-o")
+  if output_dir and not os.path.isdir(output_dir):
+    os.makedirs(output_dir)
+
+  start = datetime.datetime.now()
+  users = 0
+  for username, user, error in ingest.process(paths):
+    users += 1
+    try:
+      results = user.results() if user else None
+    except Exception as e:
+      error = e
+    if error:
+      print >> sys.stderr, "%s: %s" % (username, type(error).__name__)
+    elif output_dir:
+      with open(os.path.join(output_dir, username + ".json"), "w") as f:
+        f.write(results)
+    else:
+      print results
+
+  print >> sys.stderr, "%d lines, %d matched, %d users in %s" % (
+    ingest.lines, ingest.matches, users, datetime.datetime.now() - start
+  )
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local stand-in for reddit, for benchmarking and testing retrieval
+without network access.
+
+Serves about.json and paginated comments/submitted listings (with after
+cursors) for users recorded to fixture files or generated on the fly,
+with configurable latency, injected 429 responses and 404 users.
+
+Usage:
+  python fake_reddit.py serve [-p port] [-f fixtures_dir] [-l latency]
+                              [-r rate_limit_every] [-s comments,submissions]
+  python fake_reddit.py record <username> <fixtures_dir>
+  python fake_reddit.py benchmark [-u users] [-s comments,submissions]
+                                  [-l latency] [-w workers]
+
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import getopt
+import datetime
+import threading
+from urlparse import urlparse, parse_qs
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from transport import Transport
+
+SUBREDDITS = [
+  "AskReddit", "pics", "funny", "todayilearned", "worldnews", "Python",
+  "programming", "gaming", "movies", "Music", "books", "science",
+  "dataisbeautiful", "cats", "startups", "learnpython", "Jokes"
+]
+
+DOMAINS = [
+  "imgur.com", "i.imgur.com", "youtube.com", "youtu.be", "nytimes.com",
+  "github.com", "bbc.co.uk", "medium.com"
+]
+
+SENTENCES = [
+  "I am a software engineer and I live in Seattle.",
+  "My dog loves the beach.",
+  "That is a really interesting point.",
+  "I grew up in a small town near Boston.",
+  "Have you tried turning it off and on again?",
+  "I prefer tea over coffee.",
+  "My sister is a nurse.",
+  "This is the best thing I have seen all day.",
+  "Source: [link](http://example.com/source) \"citation needed\"",
+  "Not sure about that (but maybe)...",
+]
+
+# Default time (2017-07-14 UTC) that generated posts lead up to
+NOW = 1500000000
+
+
+def synthetic_user(
+  username, comments=500, submissions=100, seed=None, now=NOW
+):
+  """
+  Returns generated data for a user in fixture format, with posts up to
+  now (a UTC timestamp). The same username, seed and now always
+  generate the same data.
+
+  """
+
+  r = random.Random("%s:%s" % (username, seed))
+  now = int(now)
+  created = now - r.randint(365, 3650) * 86400
+
+  def timestamps(n):
+    t = now
+    for _ in range(n):
+      t -= r.randint(60, max(61, (now - created) / (n + 1) * 2))
+      yield float(max(t, created))
+
+  comment_data = []
+  for i, created_utc in enumerate(timestamps(comments)):
+    subreddit = r.choice(SUBREDDITS)
+    comment_data.append({
+      "id" : "c%x" % i,
+      "subreddit" : subreddit,
+      "body" : " ".join(r.sample(SENTENCES, r.randint(1, 4))),
+      "created_utc" : created_utc,
+      "score" : r.randint(-10, 100),
+      "link_id" : "t3_l%x" % r.randint(0, 1 << 20),
+      "parent_id" : r.choice(["t3_", "t1_"]) + "p%x" % i,
+      "edited" : False,
+      "gilded" : 1 if r.random() < 0.01 else 0
+    })
+
+  submission_data = []
+  for i, created_utc in enumerate(timestamps(submissions)):
+    subreddit = r.choice(SUBREDDITS)
+    is_self = r.random() < 0.4
+    domain = "self." + subreddit if is_self else r.choice(DOMAINS)
+    id = "s%x" % i
+    title = "Submission number %d" % i
+    submission_data.append({
+      "id" : id,
+      "subreddit" : subreddit,
+      "selftext" : " ".join(r.sample(SENTENCES, 3)) if is_self else "",
+      "created_utc" : created_utc,
+      "score" : r.randint(-10, 1000),
+      "permalink" : "/r/%s/comments/%s/submission_number_%d/" % (
+        subreddit, id, i
+      ),
+      "url" : "http://%s/%s.%s" % (
+        domain, id, r.choice(["html", "jpg", "png"])
+      ),
+      "title" : title,
+      "is_self" : is_self,
+      "gilded" : 0,
+      "domain" : domain
+    })
+
+  return {
+    "about" : {
+      "created_utc" : float(created),
+      "link_karma" : sum(s["score"] for s in submission_data),
+      "comment_karma" : sum(c["score"] for c in comment_data),
+      "name" : username,
+      "id" : "u%x" % (hash(username) & 0xffffff),
+      "is_mod" : False
+    },
+    "comments" : comment_data,
+    "submissions" : submission_data
+  }
+
+
+def record(username, path, transport=None):
+  """
+  Retrieves a user's about data and listings from reddit and saves them
+  as a fixture file in the directory path. Returns the file name.
+
+  """
+
+  transport = transport or Transport()
+  headers = {"User-Agent" : "Sherlock v0.1 by /u/orionmelt"}
+  user_url = transport.base_url + "/user/%s/" % username
+
+  about = transport.get_json(user_url + "about.json", headers=headers)
+  if "error" in about:
+    raise ValueError("User %s not found" % username)
+  fixture = {"about" : about["data"]}
+
+  for kind, listing in (("comments", "comments"), ("submissions", "submitted")):
+    fixture[kind] = []
+    url = user_url + listing + "/.json?limit=100"
+    while url:
+      response_json = transport.get_json(url, headers=headers)
+      fixture[kind] += [c["data"] for c in response_json["data"]["children"]]
+      after = response_json["data"]["after"]
+      url = user_url + listing + "/.json?limit=100&after=%s" % after \
+        if after else None
+
+  if not os.path.isdir(path):
+    os.makedirs(path)
+  filename = os.path.join(path, username.lower() + ".json")
+  with open(filename, "w") as f:
+    json.dump(fixture, f)
+  return filename
+
+
+class FakeRedditHandler(BaseHTTPRequestHandler):
+  """
+  Handles requests to a FakeRedditServer.
+
+  """
+
+  # Keep connections alive between requests, as reddit does - responses
+  # always carry a Content-Length.
+  protocol_version = "HTTP/1.1"
+  # Buffer responses and send them without waiting for acknowledgements
+  # of earlier segments, which would stall kept-alive connections.
+  wbufsize = -1
+  disable_nagle_algorithm = True
+
+  URL_PATTERN = re.compile(
+    r"^/user/([^/]+)/(about\.json|comments/\.json|submitted/\.json)$"
+  )
+
+  def do_GET(self):
+    server = self.server
+    if server.latency:
+      time.sleep(server.latency)
+
+    url = urlparse(self.path)
+    match = self.URL_PATTERN.match(url.path)
+    if not match:
+      return self.respond(404, {"message" : "Not Found", "error" : 404})
+
+    if server.throttle():
+      return self.respond(
+        429, {"message" : "Too Many Requests", "error" : 429},
+        {"Retry-After" : str(server.retry_after)}
+      )
+
+    username, endpoint = match.groups()
+    user = server.user(username)
+    if not user:
+      return self.respond(404, {"message" : "Not Found", "error" : 404})
+
+    if endpoint == "about.json":
+      return self.respond(200, {"kind" : "t2", "data" : user["about"]})
+
+    query = parse_qs(url.query)
+    limit = min(int(query.get("limit", ["25"])[0]), 100)
+    after = query.get("after", [None])[0]
+    if endpoint.startswith("comments"):
+      kind, posts = "t1", user["comments"]
+    else:
+      kind, posts = "t3", user["submissions"]
+
+    start = 0
+    if after:
+      start = next(
+        (
+          i + 1 for i, p in enumerate(posts) \
+            if "%s_%s" % (kind, p["id"]) == after or p["id"] == after
+        ), len(posts)
+      )
+    page = posts[start:start + limit]
+    self.respond(200, {
+      "kind" : "Listing",
+      "data" : {
+        "children" : [{"kind" : kind, "data" : p} for p in page],
+        "after" : "%s_%s" % (kind, page[-1]["id"]) \
+          if start + limit < len(posts) else None,
+        "before" : None
+      }
+    })
+
+  def respond(self, status, body, headers=None):
+    body = json.dumps(body)
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json; charset=UTF-8")
+    self.send_header("Content-Length", str(len(body)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class FakeRedditServer(ThreadingMixIn, HTTPServer):
+  """
+  Local HTTP server that mimics reddit's user endpoints.
+
+  * fixtures - directory of <username>.json files, as written by record.
+  * synthetic - (comments, submissions) to generate data for users that
+    have no fixture. If None, such users are not found (404).
+  * not_found - usernames that are always not found.
+  * latency - seconds to wait before responding to each request.
+  * rate_limit_every - respond with 429 to every nth request.
+  * retry_after - Retry-After seconds sent with 429 responses.
+  * now - UTC timestamp that generated posts lead up to.
+
+  """
+
+  daemon_threads = True
+  # Allow quick restarts on the same port
+  allow_reuse_address = True
+
+  def __init__(
+    self, port=0, fixtures=None, synthetic=None, not_found=(),
+    latency=0, rate_limit_every=0, retry_after=1, verbose=False, now=NOW
+  ):
+    HTTPServer.__init__(self, ("127.0.0.1", port), FakeRedditHandler)
+    self.fixtures = fixtures
+    self.synthetic = synthetic
+    self.not_found = set(u.lower() for u in not_found)
+    self.latency = latency
+    self.rate_limit_every = rate_limit_every
+    self.retry_after = retry_after
+    self.verbose = verbose
+    self.now = now
+    self.users = {}
+    self.requests = 0
+    self.connections = 0
+    self.lock = threading.Lock()
+    self.thread = None
+
+  @property
+  def base_url(self):
+    return "http://%s:%d" % self.server_address
+
+  def process_request(self, request, client_address):
+    with self.lock:
+      self.connections += 1
+    ThreadingMixIn.process_request(self, request, client_address)
+
+  def handle_error(self, request, client_address):
+    # Clients close connections without reading whole responses when
+    # they stop reading a listing early - not worth a traceback.
+    if not isinstance(sys.exc_info()[1], socket.error):
+      HTTPServer.handle_error(self, request, client_address)
+
+  def throttle(self):
+    """
+    Counts a request and returns True if it should be rate limited.
+
+    """
+
+    with self.lock:
+      self.requests += 1
+      return bool(
+        self.rate_limit_every and
+        self.requests % self.rate_limit_every == 0
+      )
+
+  def user(self, username):
+    """
+    Returns data for given user in fixture format, or None if the user
+    does not exist.
+
+    """
+
+    key = username.lower()
+    if key in self.not_found:
+      return None
+    with self.lock:
+      if key not in self.users:
+        filename = os.path.join(self.fixtures, key + ".json") \
+          if self.fixtures else None
+        if filename and os.path.exists(filename):
+          with open(filename) as f:
+            self.users[key] = json.load(f)
+        elif self.synthetic:
+          comments, submissions = self.synthetic
+          self.users[key] = synthetic_user(
+            username, comments, submissions, now=self.now
+          )
+        else:
+          self.users[key] = None
+      return self.users[key]
+
+  def start(self):
+    """
+    Starts serving in a background thread. Returns base URL to pass to
+    Transport.
+
+    """
+
+    self.thread = threading.Thread(target=self.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    return self.base_url
+
+  def stop(self):
+    """
+    Stops serving.
+
+    """
+
+    self.shutdown()
+    self.server_close()
+
+
+def benchmark(users=20, synthetic=(500, 100), latency=0.05, workers=8):
+  """
+  Times retrieval of synthetic users from a local server - one user at
+  a time, one user at a time with concurrent listings and in batches.
+
+  """
+
+  from reddit_user import UserData
+  from fetcher import BatchFetcher
+
+  usernames = ["user%d" % i for i in range(users)]
+
+  def run(name, retrieve):
+    server = FakeRedditServer(synthetic=synthetic, latency=latency)
+    base_url = server.start()
+    start = datetime.datetime.now()
+    retrieve(base_url)
+    elapsed = (datetime.datetime.now() - start).total_seconds()
+    print "%-12s %4d requests %4d connections %8.2fs %8.2f users/s" % (
+      name, server.requests, server.connections, elapsed, users / elapsed
+    )
+    server.stop()
+
+  def sequential(base_url, concurrent=False):
+    transport = Transport(base_url=base_url)
+    for username in usernames:
+      UserData(username, transport).fetch(concurrent)
+
+  def batch(base_url):
+    fetcher = BatchFetcher(
+      workers=workers, requests_per_minute=1000000,
+      transport=Transport(base_url=base_url, pool_maxsize=workers)
+    )
+    for username, json_data, error in fetcher.fetch(usernames):
+      if error:
+        raise error
+
+  run("sequential", sequential)
+  run("concurrent", lambda base_url: sequential(base_url, True))
+  run("batch", batch)
+
+
+if __name__ == "__main__":
+  if len(sys.argv) < 2 or sys.argv[1] not in ["serve", "record", "benchmark"]:
+    print __doc__
+    sys.exit(2)
+
+  command = sys.argv[1]
+  opts, args = getopt.getopt(sys.argv[2:], "p:f:l:r:s:u:w:v")
+  opts = dict(opts)
+  latency = float(opts.get("-l", 0))
+  synthetic = tuple(int(n) for n in opts["-s"].split(",")) \
+    if "-s" in opts else None
+
+  if command == "record":
+    if len(args) != 2:
+      print __doc__
+      sys.exit(2)
+    print "Recorded %s" % record(args[0], args[1])
+  elif command == "benchmark":
+    benchmark(
+      users=int(opts.get("-u", 20)),
+      synthetic=synthetic or (500, 100),
+      latency=float(opts.get("-l", 0.05)),
+      workers=int(opts.get("-w", 8))
+    )
+  else:
+    server = FakeRedditServer(
+      port=int(opts.get("-p", 8000)),
+      fixtures=opts.get("-f"),
+      synthetic=synthetic,
+      latency=latency,
+      rate_limit_every=int(opts.get("-r", 0)),
+      verbose="-v" in opts
+    )
+    print "Serving fake reddit at %s" % server.base_url
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+from Queue import Queue
+
+from reddit_user import RedditUser, UserData
+from transport import Transport, TokenBucket
+
+class BatchFetcher(object):
+  """
+  Retrieves data for a stream of redditors, keeping several listing
+  requests in flight across users.
+
+  Each worker thread retrieves one user at a time. All requests go
+  through one shared token bucket so that the combined request rate
+  across workers never exceeds the API's limit. Retrieved users are
+  processed by RedditUser in the calling thread, so processing of one
+  user overlaps with retrieval of the next ones.
+
+  """
+
+  # Number of requests in flight
+  WORKERS = 8
+  # reddit allows 60 requests per minute
+  REQUESTS_PER_MINUTE = 60
+
+  def __init__(
+    self, workers=None, requests_per_minute=None, transport=None, cache=None
+  ):
+    self.workers = workers or self.WORKERS
+    self.limiter = TokenBucket(
+      requests_per_minute or self.REQUESTS_PER_MINUTE, per=60.0
+    )
+    # cache is an optional response cache (such as a ResponseCache)
+    if not transport:
+      transport = Transport(
+        pool_maxsize=self.workers, limiter=self.limiter, cache=cache
+      )
+    else:
+      # A given transport is shared by the workers, so it has to go
+      # through the token bucket as well.
+      if not transport.limiter:
+        transport.limiter = self.limiter
+      elif requests_per_minute:
+        raise ValueError(
+          "requests_per_minute can't be applied to a transport that has "
+          "a limiter"
+        )
+      if cache:
+        if transport.cache:
+          raise ValueError(
+            "cache can't be applied to a transport that has a cache"
+          )
+        transport.cache = cache
+    self.transport = transport
+
+  def fetch(self, usernames):
+    """
+    Retrieves data for each of the given usernames. Yields
+    (username, json_data, error) tuples as users are retrieved -
+    json_data is None if retrieval failed with error.
+
+    Usernames are read lazily, so usernames can be any iterable,
+    including a generator over a large file. If reading usernames
+    fails, users already read are still retrieved and yielded before
+    the error is re-raised.
+
+    """
+
+    # Bounded so that usernames are not read far ahead of the workers
+    pending = Queue(self.workers * 2)
+    done = Queue(self.workers * 2)
+    finished = object()
+    failed = object()
+
+    def feed():
+      try:
+        for username in usernames:
+          pending.put(username)
+      except Exception:
+        done.put((failed, sys.exc_info()))
+      finally:
+        for _ in range(self.workers):
+          pending.put(finished)
+
+    def work():
+      while True:
+        username = pending.get()
+        if username is finished:
+          done.put(finished)
+          return
+        try:
+          data = UserData(username, self.transport)
+          data.fetch()
+          done.put((username, data.to_json(), None))
+        except Exception:
+          done.put((username, None, sys.exc_info()[1]))
+
+    threads = [threading.Thread(target=feed)] + [
+      threading.Thread(target=work) for _ in range(self.workers)
+    ]
+    for thread in threads:
+      thread.daemon = True
+      thread.start()
+
+    remaining = self.workers
+    feed_error = None
+    while remaining:
+      result = done.get()
+      if result is finished:
+        remaining -= 1
+      elif result[0] is failed:
+        feed_error = result[1]
+      else:
+        yield result
+    if feed_error:
+      raise feed_error[0], feed_error[1], feed_error[2]
+
+  def process(self, usernames):
+    """
+    Retrieves and processes each of the given usernames. Yields
+    (username, user, error) tuples, where user is a RedditUser or None
+    if retrieval or processing failed with error.
+
+    """
+
+    for username, json_data, error in self.fetch(usernames):
+      if error:
+        yield (username, None, error)
+        continue
+      try:
+        user = RedditUser(username, json_data=json_data)
+      except Exception:
+        yield (username, None, sys.exc_info()[1])
+      else:
+        yield (username, user, None)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import os
+import io
+from collections import OrderedDict
+
+class LemmaCache(object):
+  """
+  Cache of lemmas keyed by (word, part of speech), so that words seen
+  before don't go through WordNet again.
+
+  Lemmas are kept in memory, bounded by number of entries, and least
+  recently used entries are evicted first. If a path is given, the
+  cache is preloaded from the table of lemmas there, and save() writes
+  it back - one "word<TAB>pos<TAB>lemma" line per entry, least recently
+  used first.
+
+  """
+
+  MAX_ENTRIES = 50000
+
+  def __init__(self, path=None, max_entries=None):
+    self.path = path
+    self.max_entries = max_entries or self.MAX_ENTRIES
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    # Number of entries added since the table was loaded or saved
+    self.added = 0
+
+    # (word, pos) -> lemma, least recently used first
+    self.lemmas = OrderedDict()
+    if path:
+      for key, lemma in self.read(path):
+        self.set(key[0], key[1], lemma)
+      self.added = 0
+
+  @staticmethod
+  def read(path):
+    """
+    Yields ((word, pos), lemma) for entries of the table at path.
+
+    """
+
+    try:
+      f = io.open(path, encoding="utf-8")
+    except IOError:
+      return
+    with f:
+      for line in f:
+        fields = line.rstrip(u"\n").split(u"\t")
+        if len(fields) == 3:
+          yield (fields[0], fields[1]), fields[2]
+
+  def get(self, word, pos):
+    """
+    Returns lemma of word for given part of speech, or None if it is
+    not cached.
+
+    """
+
+    key = (word, pos)
+    lemma = self.lemmas.pop(key, None)
+    if lemma is None:
+      self.misses += 1
+      return None
+    self.lemmas[key] = lemma
+    self.hits += 1
+    return lemma
+
+  def set(self, word, pos, lemma):
+    """
+    Stores lemma of word for given part of speech, evicting least
+    recently used entries if the cache is full.
+
+    """
+
+    key = (word, pos)
+    self.lemmas.pop(key, None)
+    self.lemmas[key] = lemma
+    self.added += 1
+    while len(self.lemmas) > self.max_entries:
+      self.lemmas.popitem(last=False)
+      self.evictions += 1
+
+  def save(self):
+    """
+    Writes cached lemmas to the table, keeping entries that other
+    processes saved there in the meantime as long as there is room.
+
+    """
+
+    if not self.path:
+      return
+    lemmas = OrderedDict(
+      (key, lemma) for key, lemma in self.read(self.path) \
+        if key not in self.lemmas
+    )
+    while lemmas and len(lemmas) + len(self.lemmas) > self.max_entries:
+      lemmas.popitem(last=False)
+    lemmas.update(self.lemmas)
+
+    # Write to a temporary file first so that readers never see a
+    # partially written table.
+    tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+    with io.open(tmp_path, "w", encoding="utf-8") as f:
+      for (word, pos), lemma in lemmas.iteritems():
+        try:
+          line = u"\t".join((word, pos, lemma))
+        except UnicodeDecodeError:
+          continue
+        if u"\n" not in line and line.count(u"\t") == 2:
+          f.write(line + u"\n")
+    os.rename(tmp_path, self.path)
+    self.added = 0
+
+  def stats(self):
+    """
+    Returns cache statistics.
+
+    """
+
+    lookups = self.hits + self.misses
+    return {
+      "hits" : self.hits,
+      "misses" : self.misses,
+      "evictions" : self.evictions,
+      "entries" : len(self.lemmas),
+      "hit_rate" : round(self.hits / (lookups * 1.0 or 1), 2)
+    }
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from itertools import izip
+
+from snapshot import EDITED_FALSE, EDITED_TRUE
+
+class ArrayColumn(object):
+  """
+  Column of numbers kept in a typed array. Values are converted with
+  convert (such as bool) when read.
+
+  """
+
+  def __init__(self, typecode, convert=None):
+    self.values = array(typecode)
+    self.convert = convert
+
+  def append(self, value):
+    self.values.append(value)
+
+  def __getitem__(self, i):
+    value = self.values[i]
+    return self.convert(value) if self.convert else value
+
+  def __iter__(self):
+    if self.convert:
+      return (self.convert(value) for value in self.values)
+    return iter(self.values)
+
+
+class EditedColumn(ArrayColumn):
+  """
+  Column of edited flags - False, True or the time of the edit.
+
+  """
+
+  def __init__(self):
+    super(EditedColumn, self).__init__("d", self.decode)
+
+  @staticmethod
+  def decode(value):
+    if value == EDITED_FALSE:
+      return False
+    elif value == EDITED_TRUE:
+      return True
+    return value
+
+  def append(self, value):
+    self.values.append(
+      EDITED_FALSE if value is False else \
+      EDITED_TRUE if value is True else value
+    )
+
+
+class StringColumn(object):
+  """
+  Column of strings kept UTF-8 encoded in one buffer, and decoded only
+  when read.
+
+  """
+
+  def __init__(self):
+    self.data = bytearray()
+    self.offsets = array("I", [0])
+
+  def append(self, value):
+    if isinstance(value, unicode):
+      value = value.encode("utf-8")
+    self.data += value
+    self.offsets.append(len(self.data))
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += len(self.offsets) - 1
+    return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+  def __iter__(self):
+    data = self.data
+    start = 0
+    for end in self.offsets[1:]:
+      yield data[start:end].decode("utf-8")
+      start = end
+
+
+class InternedColumn(object):
+  """
+  Column of repeated strings (such as subreddits) kept as codes into a
+  table of distinct strings.
+
+  """
+
+  def __init__(self):
+    self.table = []
+    self.codes = {}
+    self.values = array("I")
+
+  def append(self, value):
+    code = self.codes.get(value)
+    if code is None:
+      code = self.codes[value] = len(self.table)
+      self.table.append(value)
+    self.values.append(code)
+
+  def __getitem__(self, i):
+    return self.table[self.values[i]]
+
+  def __iter__(self):
+    table = self.table
+    return (table[code] for code in self.values)
+
+
+class PostStore(object):
+  """
+  Columnar collection of posts - each attribute of the posts is kept in
+  a column (a typed array, a text buffer or codes into a string table)
+  instead of in one object per post, which takes a fraction of the
+  memory.
+
+  Behaves as a list of posts: indexing and iterating yield post_class
+  objects built from the columns on the fly. These are copies, so
+  changes to them are not stored back.
+
+  Subclasses set post_class and COLUMNS - a list of (attribute, column
+  factory) pairs in the order of post_class's constructor arguments.
+
+  """
+
+  post_class = None
+  COLUMNS = []
+
+  def __init__(self, posts=()):
+    self.columns = [factory() for attribute, factory in self.COLUMNS]
+    self.count = 0
+    self.extend(posts)
+
+  def append(self, post):
+    for (attribute, factory), column in izip(self.COLUMNS, self.columns):
+      column.append(getattr(post, attribute))
+    self.count += 1
+
+  def extend(self, posts):
+    for post in posts:
+      self.append(post)
+
+  def __iadd__(self, posts):
+    self.extend(posts)
+    return self
+
+  def __add__(self, posts):
+    return list(self) + list(posts)
+
+  def __len__(self):
+    return self.count
+
+  def values(self, attribute):
+    """
+    Returns the typed array of values of a numeric attribute, such as
+    created_utc or score.
+
+    """
+
+    for (name, factory), column in izip(self.COLUMNS, self.columns):
+      if name == attribute:
+        return column.values
+    raise KeyError(attribute)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[j] for j in xrange(*i.indices(self.count))]
+    if i < 0:
+      i += self.count
+    if not 0 <= i < self.count:
+      raise IndexError("post index out of range")
+    return self.post_class(*[column[i] for column in self.columns])
+
+  def __iter__(self):
+    post_class = self.post_class
+    for values in izip(*self.columns):
+      yield post_class(*values)
@@ -7,17 +7,32 @@ import json
 import time
 import sys
 import calendar
-from collections import Counter
-from itertools import groupby
-from urlparse import urlparse
+import threading
+from collections import Counter, OrderedDict
+from Queue import Queue
+from itertools import groupby, izip
 
-import requests
 import pytz
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 from subreddits import subreddits_dict, ignore_text_subs, default_subs
-from text_parser import TextParser
+from text_parser import TextParser, CorpusStats
+from transport import Transport
+from timeline import ActivityTimeline
+from classifier import SubmissionClassifier
+from sanitizer import TextSanitizer
+from post_store import PostStore, ArrayColumn, EditedColumn, StringColumn, \
+  InternedColumn
+from snapshot import SnapshotWriter, SnapshotReader, MAGIC, \
+  EDITED_FALSE, EDITED_TRUE
 
 parser = TextParser()
+sanitizer = TextSanitizer()
+default_transport = Transport()
 
 class UserNotFoundError(Exception):
   pass
@@ -25,6 +40,10 @@ class UserNotFoundError(Exception):
 class NoDataError(Exception):
   pass
 
+# Raised to stop retrieval when processing fails in pipelined mode
+class CancelledError(Exception):
+  pass
+
 class Util:
   """
   Contains a collection of common utility methods.
@@ -38,30 +57,7 @@ class Util:
     
     """
 
-    MAX_WORD_LENGTH = 1024
-
-    _text = " ".join([
-      l for l in text.strip().split("\n") if (
-        not l.strip().startswith("&gt;")
-      )
-    ])
-    substitutions = [
-      (r"\[(.*?)\]\((.*?)\)", r""),   # Remove links from Markdown
-      (r"[\"](.*?)[\"]", r""),    # Remove text within quotes
-      (r" \'(.*?)\ '", r""),      # Remove text within quotes
-      (r"\.+", r". "),        # Remove ellipses
-      (r"\(.*?\)", r""),        # Remove text within round brackets
-      (r"&amp;", r"&"),         # Decode HTML entities
-      (r"http.?:\S+\b", r" ")     # Remove URLs
-    ]
-    for pattern, replacement in substitutions:
-      _text = re.sub(pattern, replacement, _text, flags=re.I)
-
-    # Remove very long words
-    _text = " ".join(
-      [word for word in _text.split(" ") if len(word) <= MAX_WORD_LENGTH]
-    )
-    return _text
+    return sanitizer.sanitize(text)
 
   @staticmethod
   def coalesce(l):
@@ -100,16 +96,74 @@ class Util:
     """
     return ((val - src[0])/(src[1] - src[0])) * (dst[1]-dst[0]) + dst[0]
 
+  @staticmethod
+  def date_buckets(start, end, granularity="month"):
+    """
+    Yields start dates of consecutive day, week (starting on Monday) or 
+    month buckets covering dates from start to end, inclusive.
+
+    """
+
+    if granularity == "month":
+      year, month = start.year, start.month
+      while (year, month) <= (end.year, end.month):
+        yield datetime.date(year, month, 1)
+        month += 1
+        if month > 12:
+          year, month = year + 1, 1
+    else:
+      step = 7 if granularity == "week" else 1
+      date = start - datetime.timedelta(start.weekday() % step)
+      while date <= end:
+        yield date
+        date += datetime.timedelta(step)
+
+  @staticmethod
+  def run_concurrently(*functions):
+    """
+    Calls each of the given functions in its own thread and returns 
+    a list of their return values, in the same order as the functions. 
+    If any of the functions raises an exception, it is re-raised here.
+
+    """
+
+    results = [None] * len(functions)
+    errors = [None] * len(functions)
+
+    def run(i, function):
+      try:
+        results[i] = function()
+      except Exception:
+        errors[i] = sys.exc_info()
+
+    threads = [
+      threading.Thread(target=run, args=(i, function)) \
+        for i, function in enumerate(functions)
+    ]
+    for thread in threads:
+      thread.daemon = True
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    for error in errors:
+      if error:
+        raise error[0], error[1], error[2]
+    return results
+
 # Base class for comments and submissions
 class Post(object):
   """
   A class for "posts" - a post can either be a submission or a comment.
 
+  Posts use slots rather than a per-instance dict, since users can have 
+  tens of thousands of them.
+
   """
 
-  def __init__(
-    self, id, subreddit, text, created_utc, score, permalink, gilded
-  ):
+  __slots__ = ("id", "subreddit", "text", "created_utc", "score", "gilded")
+
+  def __init__(self, id, subreddit, text, created_utc, score, gilded):
     # Post id
     self.id = id
     # Subreddit in which this comment or submission was posted
@@ -120,10 +174,24 @@ class Post(object):
     self.created_utc = created_utc
     # Post score
     self.score = score
-    # Permalink to post
-    self.permalink = permalink
     # Gilded
     self.gilded = gilded
+
+  def to_dict(self):
+    """
+    Returns post as a dict.
+
+    """
+
+    return {
+      "id" : self.id,
+      "subreddit" : self.subreddit,
+      "text" : self.text,
+      "created_utc" : self.created_utc,
+      "score" : self.score,
+      "permalink" : self.permalink,
+      "gilded" : self.gilded
+    }
     
 
 class Comment(Post):
@@ -131,13 +199,15 @@ class Comment(Post):
   A class for comments derived from Post.
   
   """
+
+  __slots__ = ("submission_id", "edited", "top_level")
   
   def __init__(
     self, id, subreddit, text, created_utc, score, 
-    permalink, submission_id, edited, top_level, gilded
+    submission_id, edited, top_level, gilded
   ):
     super(Comment, self).__init__(
-      id, subreddit, text, created_utc, score, permalink, gilded
+      id, subreddit, text, created_utc, score, gilded
     )
     # Link ID where comment was posted
     self.submission_id = submission_id
@@ -146,6 +216,31 @@ class Comment(Post):
     # Top-level flag
     self.top_level = top_level
 
+  @property
+  def permalink(self):
+    """
+    Permalink to comment - derived when needed rather than stored, as 
+    only a few comments ever have their permalinks in results.
+
+    """
+
+    return "http://www.reddit.com/r/%s/comments/%s/_/%s" \
+      % (self.subreddit, self.submission_id, self.id)
+
+  def to_dict(self):
+    """
+    Returns comment as a dict.
+
+    """
+
+    d = super(Comment, self).to_dict()
+    d.update({
+      "submission_id" : self.submission_id,
+      "edited" : self.edited,
+      "top_level" : self.top_level
+    })
+    return d
+
 
 class Submission(Post):
   """
@@ -153,13 +248,17 @@ class Submission(Post):
   
   """
 
+  __slots__ = ("permalink", "url", "title", "is_self", "domain")
+
   def __init__(
     self, id, subreddit, text, created_utc, score, 
     permalink, url, title, is_self, gilded, domain
   ):
     super(Submission, self).__init__(
-      id, subreddit, text, created_utc, score, permalink, gilded
+      id, subreddit, text, created_utc, score, gilded
     )
+    # Permalink to submission
+    self.permalink = permalink
     # Submission link URL
     self.url = url
     # Submission title
@@ -169,8 +268,625 @@ class Submission(Post):
     # Domain
     self.domain = domain
 
+  def to_dict(self):
+    """
+    Returns submission as a dict.
+
+    """
+
+    d = super(Submission, self).to_dict()
+    d.update({
+      "url" : self.url,
+      "title" : self.title,
+      "is_self" : self.is_self,
+      "domain" : self.domain
+    })
+    return d
+
+
+class CommentStore(PostStore):
+  """
+  Columnar collection of comments - see post_store.PostStore.
+
+  """
+
+  post_class = Comment
+  COLUMNS = [
+    ("id", StringColumn),
+    ("subreddit", InternedColumn),
+    ("text", StringColumn),
+    ("created_utc", lambda: ArrayColumn("d")),
+    ("score", lambda: ArrayColumn("i")),
+    ("submission_id", StringColumn),
+    ("edited", EditedColumn),
+    ("top_level", lambda: ArrayColumn("b", bool)),
+    ("gilded", lambda: ArrayColumn("i"))
+  ]
+
+
+class SubmissionStore(PostStore):
+  """
+  Columnar collection of submissions - see post_store.PostStore.
+
+  """
+
+  post_class = Submission
+  COLUMNS = [
+    ("id", StringColumn),
+    ("subreddit", InternedColumn),
+    ("text", StringColumn),
+    ("created_utc", lambda: ArrayColumn("d")),
+    ("score", lambda: ArrayColumn("i")),
+    ("permalink", StringColumn),
+    ("url", StringColumn),
+    ("title", StringColumn),
+    ("is_self", lambda: ArrayColumn("b", bool)),
+    ("gilded", lambda: ArrayColumn("i")),
+    ("domain", InternedColumn)
+  ]
+
+
+class UserData(object):
+  """
+  Raw data about a redditor - about data, comments and submissions - 
+  either retrieved from reddit or loaded from JSON.
+
+  """
+
+  HEADERS = {
+    'User-Agent': 'Sherlock v0.1 by /u/orionmelt'
+  }
+
+  def __init__(
+    self, username, transport=None, limit=None, since=None, budget=None,
+    columnar=False
+  ):
+    self.username = username
+
+    # HTTP transport used for retrieving data - shared by default so that
+    # connections are reused across users.
+    self.transport = transport or default_transport
+
+    # In columnar mode, comments and submissions are kept in column 
+    # stores (CommentStore and SubmissionStore) rather than lists of 
+    # objects, to save memory for users with many posts.
+    self.columnar = columnar
+
+    self.about = None
+    self.comments = CommentStore() if columnar else []
+    self.submissions = SubmissionStore() if columnar else []
+
+    # Bounds on retrieval - maximum number of comments and of 
+    # submissions, UTC timestamp of oldest post to retrieve and seconds 
+    # to spend retrieving.
+    self.limit = limit
+    self.since = since
+    self.budget = budget
+    # Bound that stopped retrieval of comments/submissions, if any - 
+    # "limit", "since" or "budget".
+    self.truncated = {
+      "comments" : None,
+      "submissions" : None
+    }
+
+    # Chunks extracted from each post's text, keyed by post fullname, so 
+    # that posts don't need to be parsed again when data is reloaded.
+    self.chunks = {}
+
+
+  def fetch(self, concurrent=False, previous=None):
+    """
+    Retrieves about data, comments and submissions from reddit.
+
+    If previous (a UserData loaded from an earlier snapshot) is given, 
+    only posts newer than the ones in previous are retrieved and merged 
+    in front of them. If the user's karma hasn't changed since, nothing 
+    but about data is retrieved. limit and since apply to the merged 
+    posts. If retrieval stops (because of limit, since or budget) 
+    before it reaches the posts in previous, these are left out, as 
+    posts between them and the retrieved ones would be missing.
+
+    """
+
+    # Retrieve about
+    self.about = self.get_about()
+    if not self.about:
+      raise UserNotFoundError
+
+    self.fetch_posts(concurrent, previous)
+
+
+  def fetch_posts(self, concurrent=False, previous=None, callback=None):
+    """
+    Retrieves comments and submissions from reddit - see fetch. 
+
+    If callback is given, it is called with "comments" or "submissions" 
+    and a list of posts as soon as each page of posts is retrieved.
+
+    """
+
+    if previous:
+      self.chunks = previous.chunks
+      if (
+        self.about["link_karma"] == previous.about["link_karma"] and 
+        self.about["comment_karma"] == previous.about["comment_karma"]
+      ):
+        self.comments = self.bounded("comments", previous.comments)
+        self.submissions = self.bounded(
+          "submissions", previous.submissions
+        )
+        self.make_columnar()
+        if callback:
+          callback("comments", self.comments)
+          callback("submissions", self.submissions)
+        return
+
+    deadline = time.time() + self.budget if self.budget else None
+
+    def get_comments():
+      comments = self.get_comments(
+        limit=self.limit,
+        known_ids=set(c.id for c in previous.comments) if previous else None,
+        callback=(lambda page: callback("comments", page)) \
+          if callback else None,
+        since=self.since,
+        deadline=deadline
+      )
+      # Unless retrieval stopped short of the posts in previous
+      if previous and not self.truncated["comments"]:
+        older = self.bounded("comments", previous.comments, len(comments))
+        comments += older
+        if callback and older:
+          callback("comments", older)
+      return comments
+
+    def get_submissions():
+      submissions = self.get_submissions(
+        limit=self.limit,
+        known_ids=set(s.id for s in previous.submissions) \
+          if previous else None,
+        callback=(lambda page: callback("submissions", page)) \
+          if callback else None,
+        since=self.since,
+        deadline=deadline
+      )
+      # Unless retrieval stopped short of the posts in previous
+      if previous and not self.truncated["submissions"]:
+        older = self.bounded(
+          "submissions", previous.submissions, len(submissions)
+        )
+        submissions += older
+        if callback and older:
+          callback("submissions", older)
+      return submissions
+
+    # Retrieve comments and submissions - listings are independent of
+    # each other, so in concurrent mode both are paginated side by side.
+    if concurrent:
+      self.comments, self.submissions = Util.run_concurrently(
+        get_comments, get_submissions
+      )
+    else:
+      self.comments = get_comments()
+      self.submissions = get_submissions()
+    self.make_columnar()
+
+
+  def bounded(self, kind, posts, count=0):
+    """
+    Returns the posts, newest first, that are within since and limit, 
+    given the number of newer posts already retrieved. If posts are 
+    left out, this is recorded in truncated[kind].
+
+    """
+
+    if not self.since and not self.limit:
+      return posts
+    kept = []
+    for post in posts:
+      if self.since and post.created_utc < self.since:
+        self.truncated[kind] = "since"
+        break
+      if self.limit and count + len(kept) >= self.limit:
+        self.truncated[kind] = "limit"
+        break
+      kept.append(post)
+    return kept
+
+
+  def make_columnar(self):
+    """
+    Moves comments and submissions into column stores, in columnar mode.
+
+    """
+
+    if not self.columnar:
+      return
+    if not isinstance(self.comments, CommentStore):
+      self.comments = CommentStore(self.comments)
+    if not isinstance(self.submissions, SubmissionStore):
+      self.submissions = SubmissionStore(self.submissions)
+
+
+  def load_json(self, json_data):
+    """
+    Loads about data, comments and submissions from JSON.
+
+    """
+
+    data = json.loads(json_data)
+    self.about = {
+      "created_utc" : datetime.datetime.fromtimestamp(
+        data["about"]["created_utc"], tz=pytz.utc
+      ),
+      "link_karma" : data["about"]["link_karma"],
+      "comment_karma" : data["about"]["comment_karma"],
+      "name" : data["about"]["name"],
+      "reddit_id" : data["about"]["id"],
+      "is_mod" : data["about"]["is_mod"]
+    }
+    for c in data["comments"]:
+      self.comments.append(
+        Comment(
+          id=c["id"],
+          subreddit=c["subreddit"],
+          text=c["text"],
+          created_utc=c["created_utc"],
+          score=c["score"],
+          submission_id=c["submission_id"],
+          edited=c["edited"],
+          top_level=c["top_level"],
+          gilded=c["gilded"]
+        )
+      )
+    for s in data["submissions"]:
+      self.submissions.append(
+        Submission(
+          id=s["id"],
+          subreddit=s["subreddit"],
+          text=s["text"],
+          created_utc=s["created_utc"],
+          score=s["score"],
+          permalink=s["permalink"],
+          url=s["url"],
+          title=s["title"],
+          is_self=s["is_self"],
+          gilded=s["gilded"],
+          domain=s["domain"]
+        )
+      )
+    self.chunks = data.get("chunks", {})
+    self.make_columnar()
+
+
+  def to_json(self):
+    """
+    Returns about data, comments and submissions as JSON, in the format 
+    accepted by load_json.
+
+    """
+
+    return json.dumps({
+      "about" : {
+        "created_utc" : calendar.timegm(
+          self.about["created_utc"].utctimetuple()
+        ),
+        "link_karma" : self.about["link_karma"],
+        "comment_karma" : self.about["comment_karma"],
+        "name" : self.about["name"],
+        "id" : self.about["reddit_id"],
+        "is_mod" : self.about["is_mod"]
+      },
+      "comments" : [c.to_dict() for c in self.comments],
+      "submissions" : [s.to_dict() for s in self.submissions],
+      "chunks" : self.chunks
+    })
+
+
+  def to_snapshot(self):
+    """
+    Returns about data, comments and submissions as a compact binary 
+    snapshot, in the format accepted by load_snapshot - see 
+    snapshot.SnapshotWriter.
+
+    """
+
+    writer = SnapshotWriter()
+    writer.strings([json.dumps({
+      "created_utc" : calendar.timegm(
+        self.about["created_utc"].utctimetuple()
+      ),
+      "link_karma" : self.about["link_karma"],
+      "comment_karma" : self.about["comment_karma"],
+      "name" : self.about["name"],
+      "id" : self.about["reddit_id"],
+      "is_mod" : self.about["is_mod"]
+    }), json.dumps(self.chunks)])
+
+    comments = self.comments
+    writer.strings([c.id for c in comments])
+    writer.interned([c.subreddit for c in comments])
+    writer.strings([c.text for c in comments])
+    writer.deltas([c.created_utc for c in comments])
+    writer.array("i", [c.score for c in comments])
+    writer.array("i", [c.gilded for c in comments])
+    writer.strings([c.submission_id for c in comments])
+    writer.array("d", [
+      EDITED_FALSE if c.edited is False else \
+      EDITED_TRUE if c.edited is True else c.edited \
+        for c in comments
+    ])
+    writer.array("b", [c.top_level for c in comments])
+
+    submissions = self.submissions
+    writer.strings([s.id for s in submissions])
+    writer.interned([s.subreddit for s in submissions])
+    writer.strings([s.text for s in submissions])
+    writer.deltas([s.created_utc for s in submissions])
+    writer.array("i", [s.score for s in submissions])
+    writer.array("i", [s.gilded for s in submissions])
+    writer.strings([s.permalink for s in submissions])
+    writer.strings([s.url for s in submissions])
+    writer.strings([s.title for s in submissions])
+    writer.array("b", [s.is_self for s in submissions])
+    writer.interned([s.domain for s in submissions])
+
+    return writer.getvalue()
+
+
+  def load_snapshot(self, snapshot):
+    """
+    Loads about data, comments and submissions from a snapshot written 
+    by to_snapshot.
+
+    """
+
+    reader = SnapshotReader(snapshot)
+    about, chunks = reader.strings()
+    about = json.loads(about)
+    self.about = {
+      "created_utc" : datetime.datetime.fromtimestamp(
+        about["created_utc"], tz=pytz.utc
+      ),
+      "link_karma" : about["link_karma"],
+      "comment_karma" : about["comment_karma"],
+      "name" : about["name"],
+      "reddit_id" : about["id"],
+      "is_mod" : about["is_mod"]
+    }
+    self.chunks = json.loads(chunks)
+
+    ids = reader.strings()
+    subreddits = reader.interned()
+    texts = reader.strings()
+    created = reader.deltas()
+    scores = reader.array("i")
+    gilded = reader.array("i")
+    submission_ids = reader.strings()
+    edited = [
+      False if e == EDITED_FALSE else True if e == EDITED_TRUE else e \
+        for e in reader.array("d")
+    ]
+    top_level = reader.array("b")
+    if reader.version == 1:
+      # Comment permalinks are derived from other fields since version 2
+      reader.strings()
+    # Arguments in the order of Comment's constructor
+    comments = (
+      Comment(*args) for args in izip(
+        ids, subreddits, texts, created, scores, submission_ids, edited, 
+        map(bool, top_level), gilded
+      )
+    )
+    self.comments = \
+      CommentStore(comments) if self.columnar else list(comments)
+
+    ids = reader.strings()
+    subreddits = reader.interned()
+    texts = reader.strings()
+    created = reader.deltas()
+    scores = reader.array("i")
+    gilded = reader.array("i")
+    permalinks = reader.strings()
+    urls = reader.strings()
+    titles = reader.strings()
+    is_self = reader.array("b")
+    domains = reader.interned()
+    # Arguments in the order of Submission's constructor
+    submissions = (
+      Submission(*args) for args in izip(
+        ids, subreddits, texts, created, scores, permalinks, urls, titles, 
+        map(bool, is_self), gilded, domains
+      )
+    )
+    self.submissions = \
+      SubmissionStore(submissions) if self.columnar else list(submissions)
+
+
+  def get_about(self):
+    """
+    Returns basic data about redditor.
+
+    """
+    url = self.transport.base_url + "/user/%s/about.json" % self.username
+    response_json = self.transport.get_json(url, headers=self.HEADERS)
+    if "error" in response_json and response_json["error"] == 404:
+      return None
+    about = {
+      "created_utc" : datetime.datetime.fromtimestamp(
+        response_json["data"]["created_utc"], tz=pytz.utc
+      ),
+      "link_karma" : response_json["data"]["link_karma"],
+      "comment_karma" : response_json["data"]["comment_karma"],
+      "name" : response_json["data"]["name"],
+      "reddit_id" : response_json["data"]["id"],
+      "is_mod" : response_json["data"]["is_mod"]
+    }
+
+    return about
+
+
+  def get_comments(
+    self, limit=None, known_ids=None, callback=None, since=None, 
+    deadline=None
+  ):
+    """
+    Returns a list of redditor's comments - see get_listing.
+
+    """
+
+    return self.get_listing(
+      "comments", "comments", self.parse_comment, 
+      limit, known_ids, callback, since, deadline
+    )
+
+
+  def get_submissions(
+    self, limit=None, known_ids=None, callback=None, since=None, 
+    deadline=None
+  ):
+    """
+    Returns a list of redditor's submissions - see get_listing.
+    
+    """
+
+    return self.get_listing(
+      "submissions", "submitted", self.parse_submission, 
+      limit, known_ids, callback, since, deadline
+    )
+
+
+  def get_listing(
+    self, kind, path, parse, limit=None, known_ids=None, callback=None, 
+    since=None, deadline=None
+  ):
+    """
+    Returns a list of posts from one of redditor's listings, newest 
+    first. Each listed item is converted to a post using parse.
+
+    * If known_ids is given, stops at the first post with an id in 
+      known_ids - only posts newer than those are returned.
+    * If limit is given, returns at most limit posts.
+    * If since (a UTC timestamp) is given, stops at the first post 
+      created before since.
+    * If deadline (a time.time() value) is given, stops retrieving 
+      pages once it has passed.
+
+    If retrieval stopped because of limit, since or deadline, this is 
+    recorded in truncated[kind].
+
+    If callback is given, it is called with each page of posts as 
+    soon as the page is retrieved.
+
+    """
+
+    posts = []
+    base_url = self.transport.base_url + "/user/%s/%s/.json" \
+      % (self.username, path)
+    url = base_url + "?limit=%d" % self.page_size(limit, 0)
+    while url:
+      # Children are decoded one at a time while the page downloads
+      listing = self.transport.get_listing(url, headers=self.HEADERS)
+
+      page = []
+      stop = False
+      for child in listing:
+        post = parse(child["data"])
+        if known_ids and post.id in known_ids:
+          stop = True
+          break
+        if since and post.created_utc < since:
+          self.truncated[kind] = "since"
+          stop = True
+          break
+        if limit and len(posts) + len(page) >= limit:
+          self.truncated[kind] = "limit"
+          stop = True
+          break
+        page.append(post)
+
+      if stop:
+        listing.close()
+      elif listing.error == 404:
+        raise UserNotFoundError
+
+      posts += page
+      if callback and page:
+        callback(page)
+
+      after = None if stop else listing.after
+      url = None
+      if after:
+        if limit and len(posts) >= limit:
+          self.truncated[kind] = "limit"
+        elif deadline and time.time() >= deadline:
+          self.truncated[kind] = "budget"
+        else:
+          url = base_url + "?limit=%d&after=%s" \
+            % (self.page_size(limit, len(posts)), after)
+
+    return posts
+
+
+  @staticmethod
+  def page_size(limit, count):
+    """
+    Returns number of posts to request in the next page of a listing, 
+    given a limit on number of posts and number of posts retrieved.
+
+    """
+
+    return min(100, limit - count) if limit else 100
+
+
+  @staticmethod
+  def parse_comment(data):
+    """
+    Returns a Comment given a comment's data in a listing.
 
-class RedditUser:
+    """
+
+    id = data["id"].encode("ascii", "ignore")
+    subreddit = data["subreddit"].encode("ascii", "ignore")
+    submission_id = data["link_id"].encode("ascii", "ignore").lower()[3:]
+
+    return Comment(
+      id=id,
+      subreddit=subreddit,
+      text=data["body"],
+      created_utc=data["created_utc"],
+      score=data["score"],
+      submission_id=submission_id,
+      edited=data["edited"],
+      top_level=True if data["parent_id"].startswith("t3") else False,
+      gilded=data["gilded"]
+    )
+
+
+  @staticmethod
+  def parse_submission(data):
+    """
+    Returns a Submission given a submission's data in a listing.
+
+    """
+
+    return Submission(
+      id=data["id"].encode("ascii", "ignore"),
+      subreddit=data["subreddit"].encode("ascii", "ignore"),
+      text=data["selftext"],
+      created_utc=data["created_utc"],
+      score=data["score"],
+      permalink="http://www.reddit.com" + \
+        data["permalink"].encode("ascii", "ignore").lower(),
+      url=data["url"].encode("ascii", "ignore").lower(),
+      title=data["title"].encode("ascii", "ignore"),
+      is_self=data["is_self"],
+      gilded=data["gilded"],
+      domain=data["domain"]
+    )
+
+
+class RedditUser(UserData):
   """
   Models a redditor object. Contains methods for processing 
   comments and submissions.
@@ -181,9 +897,6 @@ class RedditUser:
   # probably interested in the topic.
   MIN_THRESHOLD = 3 
   MIN_THRESHOLD_FOR_DEFAULT = 10
-  HEADERS = {
-    'User-Agent': 'Sherlock v0.1 by /u/orionmelt'
-  }
 
   IMAGE_DOMAINS = [
     "imgur.com",
@@ -194,65 +907,57 @@ class RedditUser:
   VIDEO_DOMAINS = ["youtube.com", "youtu.be", "vimeo.com", "liveleak.com"]
   IMAGE_EXTENSIONS = ["jpg", "png", "gif", "bmp"]
 
+  # Types of submissions in type_domain_breakdown, in order
+  SUBMISSION_TYPES = ["Self", "Image", "Video", "Other"]
+  # Shared by all users, so that classifications of domains are cached
+  classifier = SubmissionClassifier(
+    IMAGE_DOMAINS, VIDEO_DOMAINS, IMAGE_EXTENSIONS
+  )
 
-  def __init__(self, username, json_data=None):
-    # Populate username and about data
-    self.username = username
+  # Number of retrieved pages that may wait for processing in 
+  # pipelined mode before retrieval pauses.
+  PIPELINE_DEPTH = 4
 
-    self.comments = []
-    self.submissions = []
+  # Number of longest gaps between posts in results
+  TOP_GAPS = 5
 
-    if not json_data:
-      # Retrieve about
+  # Sizes of buckets of posts over time in metrics["date"]
+  GRANULARITIES = ("day", "week", "month")
+
+
+  def __init__(
+    self, username, json_data=None, transport=None, concurrent=False, 
+    previous=None, pipelined=False, limit=None, since=None, budget=None,
+    snapshot=None, columnar=False, granularity="month", clip_dates=False,
+    vectorized=False
+  ):
+    # Populate username and about data
+    super(RedditUser, self).__init__(
+      username, transport, limit, since, budget, columnar
+    )
+
+    # Incremental refresh of a previously saved snapshot (JSON or binary)
+    previous_data = None
+    if previous and not (json_data or snapshot):
+      previous_data = UserData(username, transport)
+      if previous.startswith(MAGIC):
+        previous_data.load_snapshot(previous)
+      else:
+        previous_data.load_json(previous)
+
+    if json_data:
+      self.load_json(json_data)
+      pipelined = False
+    elif snapshot:
+      self.load_snapshot(snapshot)
+      pipelined = False
+    elif pipelined:
+      # Posts are retrieved while being processed - see process_pipelined
       self.about = self.get_about()
       if not self.about:
         raise UserNotFoundError
-      # Retrieve comments and submissions
-      self.comments = self.get_comments()
-      self.submissions = self.get_submissions()
     else:
-      data = json.loads(json_data)
-      self.about = {
-        "created_utc" : datetime.datetime.fromtimestamp(
-          data["about"]["created_utc"], tz=pytz.utc
-        ),
-        "link_karma" : data["about"]["link_karma"],
-        "comment_karma" : data["about"]["comment_karma"],
-        "name" : data["about"]["name"],
-        "reddit_id" : data["about"]["id"],
-        "is_mod" : data["about"]["is_mod"]
-      }
-      for c in data["comments"]:
-        self.comments.append(
-          Comment(
-            id=c["id"],
-            subreddit=c["subreddit"],
-            text=c["text"],
-            created_utc=c["created_utc"],
-            score=c["score"],
-            permalink=c["permalink"],
-            submission_id=c["submission_id"],
-            edited=c["edited"],
-            top_level=c["top_level"],
-            gilded=c["gilded"]
-          )
-        )
-      for s in data["submissions"]:
-        self.submissions.append(
-          Submission(
-            id=s["id"],
-            subreddit=s["subreddit"],
-            text=s["text"],
-            created_utc=s["created_utc"],
-            score=s["score"],
-            permalink=s["permalink"],
-            url=s["url"],
-            title=s["title"],
-            is_self=s["is_self"],
-            gilded=s["gilded"],
-            domain=s["domain"]
-          )
-        )
+      self.fetch(concurrent, previous_data)
 
     self.username = self.about["name"]
     self.signup_date = self.about["created_utc"]
@@ -264,6 +969,19 @@ class RedditUser:
     # Initialize other properties
     self.today = datetime.datetime.now(tz=pytz.utc).date()
 
+    # Size of buckets in metrics["date"] and whether buckets before the 
+    # first and after the last post are left out of results.
+    if granularity not in self.GRANULARITIES:
+      raise ValueError("Unknown granularity %s" % granularity)
+    self.granularity = granularity
+    self.clip_dates = clip_dates
+
+    # Compute time metrics for all posts at once with numpy, rather than 
+    # one post at a time - see update_metrics_vectorized.
+    if vectorized and not numpy:
+      raise ImportError("numpy is required for vectorized metrics")
+    self.vectorized = vectorized
+
     start = self.signup_date.date()
 
     self.age_in_days = (self.today - start).days
@@ -290,44 +1008,25 @@ class RedditUser:
       "recent_posts" : []
     }
 
-    self.submissions_by_type = {
-      "name" : "All",
-      "children" : [
-        {
-          "name" : "Self", 
-          "children" : []
-        },
-        {
-          "name" : "Image", 
-          "children" : []
-        },
-        {
-          "name" : "Video", 
-          "children" : []
-        },
-        {
-          "name" : "Other", 
-          "children" : []
-        }
-      ]
-    }
+    # Number of submissions by type and by domain (or by subreddit, for 
+    # self posts), in order of first submission - see submissions_by_type
+    self.submission_types = OrderedDict(
+      (submission_type, OrderedDict()) \
+        for submission_type in self.SUBMISSION_TYPES
+    )
 
+    # Buckets cover the days after signup up to today
     self.metrics["date"] = [
       {
-        "date" : (year, month), 
+        "date" : date, 
         "comments" : 0, 
         "submissions": 0, 
         "comment_karma": 0, 
         "submission_karma": 0
-      } for (year, month) in sorted(
-        list(
-          set([
-            (
-              (self.today - datetime.timedelta(days=x)).year,
-              (self.today - datetime.timedelta(days=x)).month
-            ) for x in range(0, (self.today - start).days)
-          ])
-        )
+      } for date in (
+        Util.date_buckets(
+          start + datetime.timedelta(1), self.today, granularity
+        ) if self.today > start else []
       )
     ]
 
@@ -398,189 +1097,123 @@ class RedditUser:
       "religion and spirituality" : []
     }
 
-    self.corpus = ""
+    # Word statistics of comments and self posts
+    self.corpus = CorpusStats(parser)
     
-    self.commented_dates = []
-    self.submitted_dates = []
+    # Times of comments and submissions, in microseconds since epoch - 
+    # see ActivityTimeline
+    self.comment_times = []
+    self.submission_times = []
+    # ActivityTimeline of all posts
+    self.timeline = None
     
     self.lurk_period = None
 
     self.comments_gilded = 0
     self.submissions_gilded = 0
 
-    self.process()
-
-
-  def __str__(self):
-    return str(self.results())
+    if pipelined:
+      self.process_pipelined(previous_data)
+    else:
+      self.process()
 
 
-  def get_about(self):
+  @classmethod
+  def from_snapshot(cls, snapshot, **kwargs):
     """
-    Returns basic data about redditor.
+    Returns a RedditUser processed from a snapshot written by 
+    to_snapshot.
 
     """
-    url = r"http://www.reddit.com/user/%s/about.json" % self.username
-    response = requests.get(url, headers=self.HEADERS)
-    response_json = response.json()
-    if "error" in response_json and response_json["error"] == 404:
-      return None
-    about = {
-      "created_utc" : datetime.datetime.fromtimestamp(
-        response_json["data"]["created_utc"], tz=pytz.utc
-      ),
-      "link_karma" : response_json["data"]["link_karma"],
-      "comment_karma" : response_json["data"]["comment_karma"],
-      "name" : response_json["data"]["name"],
-      "reddit_id" : response_json["data"]["id"],
-      "is_mod" : response_json["data"]["is_mod"]
-    }
 
-    return about
+    return cls(None, snapshot=snapshot, **kwargs)
+
 
+  def __str__(self):
+    return str(self.results())
 
-  def get_comments(self, limit=None):
+
+  def process(self):
     """
-    Returns a list of redditor's comments.
+    Retrieves redditor's comments and submissions and 
+    processes each of them.
 
     """
 
-    comments = []
-    more_comments = True
-    after = None
-    base_url = r"http://www.reddit.com/user/%s/comments/.json?limit=100" \
-      % self.username
-    url = base_url
-    while more_comments:
-      response = requests.get(url, headers=self.HEADERS)
-      response_json = response.json()
+    if self.comments:
+      self.process_comments()
 
-      # TODO - Error handling for user not found (404) and 
-      # rate limiting (429) errors
-      
-      for child in response_json["data"]["children"]:
-        id = child["data"]["id"].encode("ascii", "ignore")
-        subreddit = child["data"]["subreddit"].\
-          encode("ascii", "ignore")
-        text = child["data"]["body"]
-        created_utc = child["data"]["created_utc"]
-        score = child["data"]["score"]
-        submission_id = child["data"]["link_id"].\
-          encode("ascii", "ignore").lower()[3:]
-        edited = child["data"]["edited"]
-        top_level = True \
-          if child["data"]["parent_id"].startswith("t3") else False
-        gilded = child["data"]["gilded"]
-        permalink = "http://www.reddit.com/r/%s/comments/%s/_/%s" \
-          % (subreddit, submission_id, id)
-        
-        comment = Comment(
-          id=id,
-          subreddit=subreddit,
-          text=text,
-          created_utc=created_utc,
-          score=score,
-          permalink=permalink,
-          submission_id=submission_id,
-          edited=edited,
-          top_level=top_level,
-          gilded=gilded
-        )
-        
-        comments.append(comment)
+    if self.submissions:
+      self.process_submissions()
 
-      after = response_json["data"]["after"]
+    if self.vectorized:
+      self.update_metrics_vectorized()
+    
+    if self.comments or self.submissions:
+      self.derive_attributes()
 
-      if after:
-        url = base_url + "&after=%s" % after
-        # reddit may rate limit if we don't wait for 2 seconds 
-        # between successive requests. If that happens, 
-        # uncomment and increase sleep time in the following line.
-        #time.sleep(0.5) 
-      else:
-        more_comments = False
 
-    return comments
+  def process_pipelined(self, previous=None):
+    """
+    Retrieves redditor's comments and submissions and processes each 
+    page of them as soon as it is retrieved, so that processing overlaps 
+    with waiting for the network. 
 
+    Retrieved pages are handed over through a bounded queue - if 
+    processing falls behind, retrieval waits. If processing fails, 
+    retrieval is stopped before the error is re-raised.
 
-  def get_submissions(self, limit=None):
-    """
-    Returns a list of redditor's submissions.
-    
     """
 
-    submissions = []
-    more_submissions = True
-    after = None
-    base_url = r"http://www.reddit.com/user/%s/submitted/.json?limit=100" \
-      % self.username
-    url = base_url
-    while more_submissions:
-      response = requests.get(url, headers=self.HEADERS)
-      response_json = response.json()
+    pages = Queue(self.PIPELINE_DEPTH)
+    finished = object()
+    cancelled = threading.Event()
 
-      # TODO - Error handling for user not found (404) and 
-      # rate limiting (429) errors
-      
-      for child in response_json["data"]["children"]:
-        id = child["data"]["id"].encode("ascii","ignore")
-        subreddit = child["data"]["subreddit"].\
-          encode("ascii", "ignore")
-        text = child["data"]["selftext"]
-        created_utc = child["data"]["created_utc"]
-        score = child["data"]["score"]
-        permalink = "http://www.reddit.com" + \
-          child["data"]["permalink"].\
-          encode("ascii", "ignore").lower()
-        url = child["data"]["url"].encode("ascii", "ignore").lower()
-        title = child["data"]["title"].encode("ascii", "ignore")
-        is_self = child["data"]["is_self"]
-        gilded = child["data"]["gilded"]
-        domain = child["data"]["domain"]
-        
-        submission = Submission(
-          id=id,
-          subreddit=subreddit,
-          text=text,
-          created_utc=created_utc,
-          score=score,
-          permalink=permalink,
-          url=url,
-          title=title,
-          is_self=is_self,
-          gilded=gilded,
-          domain=domain
-        )         
-
-        submissions.append(submission)
-
-      after = response_json["data"]["after"]
+    def handle(kind, posts):
+      if cancelled.is_set():
+        raise CancelledError
+      pages.put((kind, posts))
 
-      if after:
-        url = base_url + "&after=%s" % after
-        # reddit may rate limit if we don't wait for 2 seconds 
-        # between successive requests. If that happens, 
-        # uncomment and increase sleep time in the following line.
-        #time.sleep(0.5) 
+    def retrieve():
+      try:
+        self.fetch_posts(
+          concurrent=True, previous=previous, callback=handle
+        )
+      except Exception:
+        pages.put((finished, sys.exc_info()))
       else:
-        more_submissions = False
-
-    return submissions
-
-
-  def process(self):
-    """
-    Retrieves redditor's comments and submissions and 
-    processes each of them.
-
-    """
-
-    if self.comments:
-      self.process_comments()
+        pages.put((finished, None))
+
+    thread = threading.Thread(target=retrieve)
+    thread.daemon = True
+    thread.start()
+
+    try:
+      while True:
+        kind, posts = pages.get()
+        if kind is finished:
+          break
+        elif kind == "comments":
+          for comment in posts:
+            self.process_comment(comment)
+        else:
+          for submission in posts:
+            self.process_submission(submission)
+    except Exception:
+      # Drain pages so that listing threads blocked on the queue see 
+      # they are cancelled, and wait for retrieval to stop.
+      error = sys.exc_info()
+      cancelled.set()
+      while kind is not finished:
+        kind, posts = pages.get()
+      thread.join()
+      raise error[0], error[1], error[2]
+    if posts:
+      raise posts[0], posts[1], posts[2]
+
+    if self.vectorized:
+      self.update_metrics_vectorized()
 
-    if self.submissions:
-      self.process_submissions()
-    
     if self.comments or self.submissions:
       self.derive_attributes()
 
@@ -591,15 +1224,6 @@ class RedditUser:
 
     """
 
-    if not self.comments:
-      return
-    
-    self.earliest_comment = self.comments[-1]
-    self.latest_comment = self.comments[0]
-
-    self.best_comment = self.comments[0]
-    self.worst_comment = self.comments[0]
-
     for comment in self.comments:
       self.process_comment(comment)
 
@@ -610,15 +1234,6 @@ class RedditUser:
 
     """
 
-    if not self.submissions:
-      return
-    
-    self.earliest_submission = self.submissions[-1]
-    self.latest_submission = self.submissions[0]
-
-    self.best_submission = self.submissions[0]
-    self.worst_submission = self.submissions[0]
-
     for submission in self.submissions:
       self.process_submission(submission)
 
@@ -630,23 +1245,36 @@ class RedditUser:
     * Updates metrics
     * Sanitizes and extracts chunks from comment.
 
+    Comments are expected to be processed newest first.
+
     """
 
+    if not self.latest_comment:
+      self.latest_comment = comment
+      self.best_comment = comment
+      self.worst_comment = comment
+    self.earliest_comment = comment
+
     # Sanitize comment text.
     text = Util.sanitize_text(comment.text)
 
     # Add comment text to corpus.
-    self.corpus += text.lower()
+    self.corpus.add(text.lower())
 
     comment_timestamp = datetime.datetime.fromtimestamp(
       comment.created_utc, tz=pytz.utc
     )
 
-    self.commented_dates.append(comment_timestamp)
+    self.comment_times.append(
+      ActivityTimeline.microseconds(comment.created_utc)
+    )
     self.comments_gilded += comment.gilded
 
     days_ago_60 = self.today - datetime.timedelta(60)
-    if (comment_timestamp.date() - days_ago_60).days > 0:
+    if self.vectorized:
+      # Metrics are computed once all posts are processed
+      pass
+    elif (comment_timestamp.date() - days_ago_60).days > 0:
       self.metrics["heatmap"][
         (comment_timestamp.date() - days_ago_60).days*24 + \
         comment_timestamp.hour
@@ -659,29 +1287,8 @@ class RedditUser:
       ] += 1
     
     # Update metrics
-    for i, d in enumerate(self.metrics["date"]):
-      if d["date"] == (
-        comment_timestamp.date().year, 
-        comment_timestamp.date().month
-      ):
-        d["comments"] += 1
-        d["comment_karma"] += comment.score
-        self.metrics["date"][i] = d
-        break
-
-    for i, h in enumerate(self.metrics["hour"]):
-      if h["hour"] == comment_timestamp.hour:
-        h["comments"] += 1
-        h["comment_karma"] += comment.score
-        self.metrics["hour"][i] = h
-        break
-
-    for i, w in enumerate(self.metrics["weekday"]):
-      if w["weekday"] == comment_timestamp.date().weekday():
-        w["comments"] += 1
-        w["comment_karma"] += comment.score
-        self.metrics["weekday"][i] = w
-        break
+    if not self.vectorized:
+      self.update_metrics(comment_timestamp, comment.score, "comment")
 
     if comment.score > self.best_comment.score:
       self.best_comment = comment
@@ -698,9 +1305,15 @@ class RedditUser:
     if not re.search(r"\b(i|my)\b", text, re.I):
       return False
     
-    # Now, this is a comment that needs to be processed.
-    (chunks, sentiments) = parser.extract_chunks(text)
-    self.sentiments += sentiments
+    # Now, this is a comment that needs to be processed - unless it 
+    # already was, when loaded from a previous snapshot.
+    key = "t1_" + comment.id
+    if key in self.chunks:
+      chunks = self.chunks[key]
+    else:
+      (chunks, sentiments) = parser.extract_chunks(text)
+      self.sentiments += sentiments
+      self.chunks[key] = chunks
 
     for chunk in chunks:
       self.load_attributes(chunk, comment)
@@ -708,6 +1321,144 @@ class RedditUser:
     return True
 
 
+  def date_bucket(self, date):
+    """
+    Returns index of the bucket in metrics["date"] that given date falls 
+    in - buckets are consecutive, so this is the number of days, weeks 
+    or months since the first bucket.
+
+    """
+
+    first = self.metrics["date"][0]["date"]
+    if self.granularity == "month":
+      return (date.year - first.year) * 12 + date.month - first.month
+    elif self.granularity == "week":
+      return (date - first).days // 7
+    else:
+      return (date - first).days
+
+
+  def update_metrics(self, timestamp, score, kind):
+    """
+    Adds a post created at timestamp (a datetime) with given score to 
+    date, hour and weekday metrics. kind is "comment" or "submission".
+
+    Buckets are found by index arithmetic rather than by searching - see 
+    date_bucket - hour and weekday buckets are in order of hour and 
+    weekday.
+
+    """
+
+    posts_key = kind + "s"
+    karma_key = kind + "_karma"
+    date = timestamp.date()
+
+    # Posts outside the date range of the buckets are not counted
+    if self.metrics["date"]:
+      i = self.date_bucket(date)
+      if 0 <= i < len(self.metrics["date"]):
+        d = self.metrics["date"][i]
+        d[posts_key] += 1
+        d[karma_key] += score
+
+    h = self.metrics["hour"][timestamp.hour]
+    h[posts_key] += 1
+    h[karma_key] += score
+
+    w = self.metrics["weekday"][date.weekday()]
+    w[posts_key] += 1
+    w[karma_key] += score
+
+
+  def update_metrics_vectorized(self):
+    """
+    Computes the metrics of update_metrics, heatmap, recent_karma and 
+    recent_posts for all comments and submissions at once, using numpy. 
+    Gives exactly the same metrics as processing posts one at a time.
+
+    """
+
+    epoch = datetime.date(1970, 1, 1)
+    # Days since epoch of the day before the 60 days of recent metrics
+    days_ago_60 = (self.today - epoch).days - 60
+
+    buckets = self.metrics["date"]
+    if buckets:
+      first = buckets[0]["date"]
+      first_month = (first.year - 1970) * 12 + first.month - 1
+      first_day = (first - epoch).days
+
+    for kind, posts in (
+      ("comment", self.comments), ("submission", self.submissions)
+    ):
+      if not posts:
+        continue
+      posts_key = kind + "s"
+      karma_key = kind + "_karma"
+
+      if isinstance(posts, PostStore):
+        created_utc = numpy.array(posts.values("created_utc"), dtype=float)
+        scores = numpy.array(posts.values("score"), dtype=numpy.int64)
+      else:
+        created_utc = numpy.array([p.created_utc for p in posts], float)
+        scores = numpy.array([p.score for p in posts], numpy.int64)
+
+      # Whole seconds as datetime.fromtimestamp rounds them - fractions 
+      # are rounded to microseconds, which can carry into the next second.
+      seconds = numpy.trunc(created_utc)
+      seconds += numpy.round((created_utc - seconds) * 1e6) >= 1e6
+      seconds = seconds.astype(numpy.int64)
+      days = seconds // 86400
+      hours = seconds % 86400 // 3600
+      # 1970-01-01 was a Thursday
+      weekdays = (days + 3) % 7
+
+      def add(index, size, mask=None):
+        # Adds post counts and karma by bucket index to dicts in metrics
+        if mask is not None:
+          counts = numpy.bincount(index[mask], minlength=size)
+          karma = numpy.bincount(index[mask], scores[mask], minlength=size)
+        else:
+          counts = numpy.bincount(index, minlength=size)
+          karma = numpy.bincount(index, scores, minlength=size)
+        return counts.tolist(), karma.astype(numpy.int64).tolist()
+
+      for metric, index in (("hour", hours), ("weekday", weekdays)):
+        counts, karma = add(index, len(self.metrics[metric]))
+        for bucket, count, k in izip(self.metrics[metric], counts, karma):
+          bucket[posts_key] += count
+          bucket[karma_key] += k
+
+      if buckets:
+        if self.granularity == "month":
+          index = days.astype("datetime64[D]").astype("datetime64[M]")
+          index = index.astype(numpy.int64) - first_month
+        elif self.granularity == "week":
+          index = (days - first_day) // 7
+        else:
+          index = days - first_day
+        mask = (index >= 0) & (index < len(buckets))
+        counts, karma = add(index, len(buckets), mask)
+        for bucket, count, k in izip(buckets, counts, karma):
+          bucket[posts_key] += count
+          bucket[karma_key] += k
+
+      recent = days - days_ago_60
+      mask = (recent > 0) & (recent <= 60)
+      counts, karma = add(recent, 61, mask)
+      for i in xrange(61):
+        self.metrics["recent_posts"][i] += counts[i]
+        self.metrics["recent_karma"][i] += karma[i]
+
+      # Submissions are placed one day earlier in the heatmap
+      offset = 0 if kind == "comment" else 1
+      heatmap = numpy.bincount(
+        ((recent - offset) * 24 + hours)[mask], minlength=24 * 61
+      ).tolist()
+      for i in xrange(24 * 61):
+        self.metrics["heatmap"][i] += heatmap[i]
+
+
   def process_submission(self, submission):
     """
     Process a single submission.
@@ -715,21 +1466,34 @@ class RedditUser:
     * Updates metrics
     * Sanitizes and extracts chunks from self text.
 
+    Submissions are expected to be processed newest first.
+
     """
 
+    if not self.latest_submission:
+      self.latest_submission = submission
+      self.best_submission = submission
+      self.worst_submission = submission
+    self.earliest_submission = submission
+
     if(submission.is_self):
       text = Util.sanitize_text(submission.text)
-      self.corpus += text.lower()
+      self.corpus.add(text.lower())
 
     submission_timestamp = datetime.datetime.fromtimestamp(
       submission.created_utc, tz=pytz.utc
     )
 
-    self.submitted_dates.append(submission_timestamp)
+    self.submission_times.append(
+      ActivityTimeline.microseconds(submission.created_utc)
+    )
     self.submissions_gilded += submission.gilded
 
     days_ago_60 = self.today - datetime.timedelta(60)
-    if (submission_timestamp.date() - days_ago_60).days>0:
+    if self.vectorized:
+      # Metrics are computed once all posts are processed
+      pass
+    elif (submission_timestamp.date() - days_ago_60).days>0:
       self.metrics["heatmap"][
         ((submission_timestamp.date() - days_ago_60).days-1)*24 + \
         submission_timestamp.hour
@@ -741,64 +1505,15 @@ class RedditUser:
         (submission_timestamp.date() - days_ago_60).days
       ] += 1
 
-    for i, d in enumerate(self.metrics["date"]):
-      if d["date"] == (
-        submission_timestamp.date().year, 
-        submission_timestamp.date().month
-      ):
-        d["submissions"] += 1
-        d["submission_karma"] += submission.score
-        self.metrics["date"][i] = d
-        break
-
-    for i, h in enumerate(self.metrics["hour"]):
-      if h["hour"] == submission_timestamp.hour:
-        h["submissions"] += 1
-        h["submission_karma"] += submission.score
-        self.metrics["hour"][i] = h
-        break
-
-    for i, w in enumerate(self.metrics["weekday"]):
-      if w["weekday"] == submission_timestamp.date().weekday():
-        w["submissions"] += 1
-        w["submission_karma"] += submission.score
-        self.metrics["weekday"][i] = w
-        break
+    if not self.vectorized:
+      self.update_metrics(
+        submission_timestamp, submission.score, "submission"
+      )
 
-    submission_type = None
-    submission_domain = None
-    submission_url_path = urlparse(submission.url).path
-    
-    if submission.domain.startswith("self."):
-      submission_type = "Self"
-      submission_domain = submission.subreddit
-    elif (
-      submission_url_path.endswith(tuple(self.IMAGE_EXTENSIONS)) or 
-      submission.domain.endswith(tuple(self.IMAGE_DOMAINS))
-    ):
-      submission_type = "Image"
-      submission_domain = submission.domain
-    elif submission.domain.endswith(tuple(self.VIDEO_DOMAINS)):
-      submission_type = "Video"
-      submission_domain = submission.domain
-    else:
-      submission_type = "Other"
-      submission_domain = submission.domain
-    t = [
-      x for x in self.submissions_by_type["children"] \
-        if x["name"]==submission_type
-    ][0]
-    d = (
-      [x for x in t["children"] if x["name"]==submission_domain] or \
-      [None]
-    )[0]
-    if d:
-      d["size"] += 1
-    else:
-      t["children"].append({
-        "name" : submission_domain,
-        "size" : 1
-      })
+    submission_type, submission_domain = \
+      self.classifier.classify(submission)
+    domains = self.submission_types[submission_type]
+    domains[submission_domain] = domains.get(submission_domain, 0) + 1
 
     if submission.score > self.best_submission.score:
       self.best_submission = submission
@@ -815,8 +1530,13 @@ class RedditUser:
     if not submission.is_self or not re.search(r"\b(i|my)\b",text,re.I):
       return False
     
-    (chunks, sentiments) = parser.extract_chunks(text)
-    self.sentiments += sentiments
+    key = "t3_" + submission.id
+    if key in self.chunks:
+      chunks = self.chunks[key]
+    else:
+      (chunks, sentiments) = parser.extract_chunks(text)
+      self.sentiments += sentiments
+      self.chunks[key] = chunks
 
     for chunk in chunks:
       self.load_attributes(chunk, submission)
@@ -1080,71 +1800,86 @@ class RedditUser:
     elif "husband" in [v for v, s in self.relationship_partners]:
       self.derived_attributes["gender"].append("female")
 
-    commented_dates = sorted(self.commented_dates)
-    submitted_dates = sorted(self.submitted_dates)
-    active_dates = sorted(self.commented_dates + self.submitted_dates)
+    comments = ActivityTimeline(self.comment_times)
+    submissions = ActivityTimeline(self.submission_times)
+    self.timeline = ActivityTimeline.merge(comments, submissions)
 
-    min_date = datetime.datetime(datetime.MINYEAR, 1, 1, tzinfo=pytz.utc)
-    first_comment_date = \
-      min(commented_dates) if commented_dates else min_date
-    first_submission_date = \
-      min(submitted_dates) if submitted_dates else min_date
-    
+    # Latest of the first comment and the first submission
+    first_post = max(
+      timeline.first() for timeline in [comments, submissions] if len(timeline)
+    )
+    self.first_post_date = datetime.datetime.fromtimestamp(
+      first_post // 1000000, tz=pytz.utc
+    ).replace(microsecond=first_post % 1000000)
+
+    # Find the longest period of inactivity, up to now - the shortest of 
+    # the longest gaps between comments, between submissions and between 
+    # posts.
+    now = ActivityTimeline.datetime_microseconds(
+      datetime.datetime.now(tz=pytz.utc)
+    )
+    start, end = min(
+      [
+        timeline.longest_gap(until=now) for timeline in [
+          comments, submissions, self.timeline
+        ] if len(timeline)
+      ],
+      key=lambda gap: gap[1] - gap[0]
+    )
+    self.lurk_period = {
+      "from" : start // 1000000,
+      "to" : end // 1000000
+    }
 
-    self.first_post_date = max(first_comment_date, first_submission_date)
-    
-    active_dates += [datetime.datetime.now(tz=pytz.utc)]
-    commented_dates += [datetime.datetime.now(tz=pytz.utc)]
-    submitted_dates += [datetime.datetime.now(tz=pytz.utc)]
 
-    # Find the longest period of inactivity
-    comment_lurk_period = max(
-      [
-        {
-          "from" : calendar.timegm(d1.utctimetuple()), 
-          "to" : calendar.timegm(d2.utctimetuple()), 
-          "days" : (d2 - d1).total_seconds(), 
-        } for d1, d2 in zip(
-          commented_dates, commented_dates[1:]
-        )
-      ], key=lambda x:x["days"]
-    ) if len(commented_dates) > 1 else {"days":-1}
+  def activity(self):
+    """
+    Returns statistics of gaps between posts and of sessions of posts - 
+    see ActivityTimeline.
 
-    submission_lurk_period = max(
-      [
-        {
-          "from" : calendar.timegm(d1.utctimetuple()), 
-          "to" : calendar.timegm(d2.utctimetuple()), 
-          "days" : (d2 - d1).total_seconds(), 
-        } for d1, d2 in zip(
-          submitted_dates, submitted_dates[1:]
-        )
-      ], key=lambda x:x["days"]
-    ) if len(submitted_dates) > 1 else {"days":-1}
+    """
 
-    post_lurk_period = max(
-      [
+    sessions = self.timeline.sessions()
+    median_gap = self.timeline.median_gap()
+    return {
+      "sessions" : len(sessions),
+      "posts_per_session" : round(
+        len(self.timeline) / (len(sessions) * 1.0 or 1), 2
+      ),
+      "longest_session" : max(
+        (end - start) // 1000000 for start, end, posts in sessions
+      ) if sessions else 0,
+      "median_gap" : median_gap // 1000000 \
+        if median_gap is not None else None,
+      "longest_gaps" : [
         {
-          "from" : calendar.timegm(d1.utctimetuple()), 
-          "to" : calendar.timegm(d2.utctimetuple()), 
-          "days" : (d2 - d1).total_seconds(),
-        } for d1, d2 in zip(
-          active_dates, active_dates[1:]
-        )
-      ], key=lambda x:x["days"]
-    )
+          "from" : start // 1000000,
+          "to" : end // 1000000
+        } for start, end in self.timeline.top_gaps(self.TOP_GAPS)
+      ]
+    }
 
-    self.lurk_period = min(
-      [
-        x for x in [
-          comment_lurk_period, 
-          submission_lurk_period, 
-          post_lurk_period
-        ] if x["days"]>=0
-      ],
-      key=lambda x:x["days"]
-    )
-    del self.lurk_period["days"]
+
+  def submissions_by_type(self):
+    """
+    Returns a tree of submission counts by type and by domain.
+
+    """
+
+    return {
+      "name" : "All",
+      "children" : [
+        {
+          "name" : submission_type,
+          "children" : [
+            {
+              "name" : domain,
+              "size" : size
+            } for domain, size in domains.iteritems()
+          ]
+        } for submission_type, domains in self.submission_types.iteritems()
+      ]
+    }
 
 
   def commented_subreddits(self):
@@ -1185,11 +1920,21 @@ class RedditUser:
     
     # Format metrics
     metrics_date = []
+
+    dates = self.metrics["date"]
+    if self.clip_dates:
+      # Leave out buckets before the first and after the last post
+      active = [
+        i for i, d in enumerate(dates) if d["comments"] or d["submissions"]
+      ]
+      dates = dates[active[0]:active[-1] + 1] if active else []
     
-    for d in self.metrics["date"]:
+    for d in dates:
       metrics_date.append(
         {
-          "date" : "%d-%02d-01" % (d["date"][0], d["date"][1]), 
+          "date" : "%d-%02d-%02d" % (
+            d["date"].year, d["date"].month, d["date"].day
+          ), 
           "comments" : d["comments"],
           "submissions" : d["submissions"],
           "posts" : d["comments"] + d["submissions"],
@@ -1453,12 +2198,10 @@ class RedditUser:
       {
         "text" : word, 
         "size" : count
-      } for word, count in Counter(
-        parser.common_words(self.corpus)
-      ).most_common(200)
+      } for word, count in self.corpus.common_words(200)
     ]
-    total_word_count = parser.total_word_count(self.corpus)
-    unique_word_count = parser.unique_word_count(self.corpus)
+    total_word_count = self.corpus.total_word_count()
+    unique_word_count = self.corpus.unique_word_count()
 
     # Let's use an average of 40 WPM
     hours_typed = round(total_word_count/(40.00*60.00), 2) 
@@ -1915,7 +2658,8 @@ class RedditUser:
         "latest_comment_id" : self.latest_comment.id \
           if self.latest_comment else None,
         "latest_submission_id" : self.latest_submission.id \
-          if self.latest_submission else None
+          if self.latest_submission else None,
+        "truncated" : self.truncated
       },
       "summary" : {
         "signup_date" : calendar.timegm(
@@ -1925,6 +2669,7 @@ class RedditUser:
             self.first_post_date.utctimetuple()
           ),
         "lurk_period" : self.lurk_period,
+        "activity" : self.activity(),
         "comments" : {
           "count" : len(self.comments),
           "gilded" : self.comments_gilded,
@@ -1973,7 +2718,7 @@ class RedditUser:
             computed_submission_karma / 
             (len(self.submissions) or 1), 2
           ),
-          "type_domain_breakdown" : self.submissions_by_type
+          "type_domain_breakdown" : self.submissions_by_type()
         }
       },
       "synopsis" : synopsis,
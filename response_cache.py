@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import errno
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResponseCache(object):
+  """
+  Persistent on-disk cache of HTTP response bodies, keyed by URL
+  (including the after cursor of listing pages).
+
+  Each response is stored in its own file. A file's modification time is
+  the time it was stored and its access time is the time it was last
+  used, so the least recently used order survives restarts. The cache
+  is bounded by number of entries and total size.
+
+  """
+
+  # Time to live in seconds for about.json responses
+  ABOUT_TTL = 5 * 60
+  # Time to live for the first page of a listing
+  LISTING_TTL = 10 * 60
+  # Time to live for deeper listing pages - older posts rarely change
+  PAGE_TTL = 24 * 60 * 60
+
+  MAX_ENTRIES = 10000
+  MAX_BYTES = 256 * 1024 * 1024
+
+  def __init__(
+    self, path, max_entries=None, max_bytes=None,
+    about_ttl=None, listing_ttl=None, page_ttl=None
+  ):
+    self.path = path
+    self.max_entries = max_entries or self.MAX_ENTRIES
+    self.max_bytes = max_bytes or self.MAX_BYTES
+    self.about_ttl = self.ABOUT_TTL if about_ttl is None else about_ttl
+    self.listing_ttl = \
+      self.LISTING_TTL if listing_ttl is None else listing_ttl
+    self.page_ttl = self.PAGE_TTL if page_ttl is None else page_ttl
+
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.expired = 0
+    self.evictions = 0
+
+    try:
+      os.makedirs(path)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+
+    # Key -> size of entry, least recently used first
+    self.index = OrderedDict()
+    self.size = 0
+    entries = []
+    for name in os.listdir(path):
+      if name.endswith(".tmp"):
+        os.remove(os.path.join(path, name))
+        continue
+      st = os.stat(os.path.join(path, name))
+      entries.append((st.st_atime, name, st.st_size))
+    for atime, name, size in sorted(entries):
+      self.index[name] = size
+      self.size += size
+
+  def key(self, url):
+    """
+    Returns cache key for given URL.
+
+    """
+
+    return hashlib.sha1(url).hexdigest()
+
+  def ttl(self, url):
+    """
+    Returns time to live in seconds for given URL.
+
+    """
+
+    if "/about.json" in url:
+      return self.about_ttl
+    elif "after=" in url:
+      return self.page_ttl
+    else:
+      return self.listing_ttl
+
+  def get(self, url):
+    """
+    Returns cached response body for given URL, or None if the URL is
+    not cached or its entry has expired.
+
+    """
+
+    key = self.key(url)
+    filename = os.path.join(self.path, key)
+    with self.lock:
+      if key not in self.index:
+        self.misses += 1
+        return None
+      now = time.time()
+      try:
+        stored = os.stat(filename).st_mtime
+        if now - stored > self.ttl(url):
+          self.expired += 1
+          self.misses += 1
+          self.remove(key)
+          return None
+        with open(filename, "rb") as f:
+          body = f.read()
+        os.utime(filename, (now, stored))
+      except (IOError, OSError):
+        self.misses += 1
+        self.remove(key)
+        return None
+      self.index[key] = self.index.pop(key)
+      self.hits += 1
+      return body
+
+  def set(self, url, body):
+    """
+    Stores response body for given URL, evicting least recently used
+    entries if the cache is full.
+
+    """
+
+    key = self.key(url)
+    filename = os.path.join(self.path, key)
+    with self.lock:
+      if key in self.index:
+        self.size -= self.index.pop(key)
+      # Write to a temporary file first so that readers never see a
+      # partially written entry.
+      tmp_filename = filename + ".tmp"
+      with open(tmp_filename, "wb") as f:
+        f.write(body)
+      os.rename(tmp_filename, filename)
+      self.index[key] = len(body)
+      self.size += len(body)
+      while self.index and (
+        len(self.index) > self.max_entries or self.size > self.max_bytes
+      ):
+        self.remove(next(iter(self.index)))
+        self.evictions += 1
+
+  def remove(self, key):
+    """
+    Removes entry with given key. Caller must hold the lock.
+
+    """
+
+    self.size -= self.index.pop(key, 0)
+    try:
+      os.remove(os.path.join(self.path, key))
+    except OSError:
+      pass
+
+  def stats(self):
+    """
+    Returns cache statistics.
+
+    """
+
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "hits" : self.hits,
+        "misses" : self.misses,
+        "expired" : self.expired,
+        "evictions" : self.evictions,
+        "entries" : len(self.index),
+        "bytes" : self.size,
+        "hit_rate" : round(self.hits / (lookups * 1.0 or 1), 2)
+      }
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+class TextSanitizer(object):
+  """
+  Removes unnecessary parts of texts - quoted lines, Markdown links,
+  quotes, bracketed text and URLs - for Util.sanitize_text.
+
+  Substitutions are applied one after another, as each one may change
+  what the next one matches. Each is skipped unless the text contains
+  a string that its pattern cannot match without (its trigger), so most
+  texts go through few or no regular expressions.
+
+  """
+
+  # Words longer than this are removed
+  MAX_WORD_LENGTH = 1024
+
+  # (trigger, pattern, replacement), in order of application
+  SUBSTITUTIONS = [
+    ("[", r"\[(.*?)\]\((.*?)\)", r""),  # Remove links from Markdown
+    ("\"", r"[\"](.*?)[\"]", r""),    # Remove text within quotes
+    (" '", r" \'(.*?)\ '", r""),      # Remove text within quotes
+    (".", r"\.+", r". "),         # Remove ellipses
+    ("(", r"\(.*?\)", r""),         # Remove text within round brackets
+    ("&", r"&amp;", r"&"),          # Decode HTML entities
+    (":", r"http.?:\S+\b", r" ")      # Remove URLs
+  ]
+
+  def __init__(self):
+    self.substitutions = [
+      (trigger, re.compile(pattern, flags=re.I), replacement)
+      for trigger, pattern, replacement in self.SUBSTITUTIONS
+    ]
+
+  @staticmethod
+  def join_lines(text):
+    """
+    Returns text with lines joined by spaces, leaving out quoted lines.
+
+    """
+
+    if "&gt;" not in text:
+      return text.strip().replace("\n", " ")
+    return " ".join([
+      l for l in text.strip().split("\n") if (
+        not l.strip().startswith("&gt;")
+      )
+    ])
+
+  def sanitize(self, text):
+    """
+    Returns text after removing unnecessary parts.
+
+    """
+
+    text = self.join_lines(text)
+    for trigger, pattern, replacement in self.substitutions:
+      if trigger not in text:
+        continue
+      if trigger == "." and ".." not in text:
+        # No runs of dots to collapse
+        text = text.replace(".", ". ")
+      else:
+        text = pattern.sub(replacement, text)
+
+    # Remove very long words
+    if len(text) > self.MAX_WORD_LENGTH:
+      text = " ".join([
+        word for word in text.split(" ")
+        if len(word) <= self.MAX_WORD_LENGTH
+      ])
+    return text
@@ -1,19 +1,236 @@
 # -*- coding: utf-8 -*-
 
+"""
+Usage:
+  python sherlock.py [-r <cache-dir>] <reddit-username>
+  python sherlock.py -u <usernames-file> [options]
+  python sherlock.py -s <snapshot-dir> [options]
+
+Options:
+  -o <output-dir>   Write results of each user to <output-dir>/<user>.json
+  -n <ndjson-file>  Write results as newline-delimited JSON (default: stdout)
+  -p <processes>    Number of processes (default: number of CPUs)
+  -l <lemma-file>   Preload lemmas from <lemma-file> and save new ones there
+  -c <chunk-db>     Cache tags and chunks of sentences in SQLite <chunk-db>
+  -r <cache-dir>    Cache responses from reddit in <cache-dir>
+
+"""
+
+import os
 import sys
 import datetime
 import getopt
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
+
+from reddit_user import RedditUser, UserNotFoundError, NoDataError, parser
+from fetcher import BatchFetcher
+from transport import Transport
+from response_cache import ResponseCache
+from snapshot import MAGIC
+from lemma_cache import LemmaCache
+from chunk_cache import ChunkCache
+
+# Lemmas added to a worker's cache before it saves the lemma table
+LEMMA_SAVE_INTERVAL = 1000
+
+def init_worker(lemma_file=None, chunk_db=None):
+  """
+  Replaces the parser's lemma cache with one preloaded from lemma_file
+  and its chunk cache with one stored in chunk_db, if given. Runs at
+  the start of each worker process; the lemma table is saved and the
+  chunk database closed when the process exits.
+
+  """
+
+  if lemma_file:
+    parser.lemma_cache = LemmaCache(lemma_file)
+    multiprocessing.util.Finalize(
+      parser.lemma_cache, parser.lemma_cache.save, exitpriority=10
+    )
+  if chunk_db:
+    parser.chunk_cache = ChunkCache(parser.chunk_version, chunk_db)
+    multiprocessing.util.Finalize(
+      parser.chunk_cache, parser.chunk_cache.close, exitpriority=10
+    )
+
+def process_user(task):
+  """
+  Processes one user in a worker process. task is (username, json_data,
+  path, error) - data is read from json_data or, if None, from the
+  snapshot at path. Returns (username, results, error), where results
+  is None if processing failed and error is the error's type name.
+
+  """
+
+  username, json_data, path, error = task
+  if error:
+    return (username, None, error)
+  try:
+    if json_data is None:
+      with open(path, "rb") as f:
+        json_data = f.read()
+    if json_data.startswith(MAGIC):
+      user = RedditUser.from_snapshot(json_data)
+    else:
+      user = RedditUser(username, json_data=json_data)
+    return (user.username, user.results(), None)
+  except Exception as e:
+    return (username, None, type(e).__name__)
+  finally:
+    if parser.lemma_cache.added >= LEMMA_SAVE_INTERVAL:
+      parser.lemma_cache.save()
+
+def read_usernames(filename):
+  """
+  Yields usernames in given file, one per line.
+
+  """
+
+  with open(filename) as f:
+    for line in f:
+      if line.strip():
+        yield line.strip()
+
+def fetch_tasks(filename, cache=None):
+  """
+  Yields tasks for usernames in given file, retrieving their data from
+  reddit in this process so that all requests share one rate limit.
+  Responses are cached in cache if given.
+
+  """
+
+  fetcher = BatchFetcher(cache=cache)
+  for username, json_data, error in fetcher.fetch(read_usernames(filename)):
+    yield (username, json_data, None, type(error).__name__ if error else None)
+
+def snapshot_tasks(path):
+  """
+  Yields tasks for snapshots in given directory - JSON (.json, as saved
+  by UserData.to_json) or binary (.snap, as saved by
+  UserData.to_snapshot).
+
+  """
+
+  for filename in sorted(os.listdir(path)):
+    username, extension = os.path.splitext(filename)
+    if extension in (".json", ".snap"):
+      yield (username, None, os.path.join(path, filename), None)
+
+def process_batch(
+  tasks, processes=None, output_dir=None, output=None, lemma_file=None,
+  chunk_db=None
+):
+  """
+  Processes tasks over a pool of worker processes, writing results of
+  each user to output_dir or as newline-delimited JSON to output.
+  Workers preload lemmas from lemma_file and share cached chunks in
+  chunk_db if given. Returns number of users processed and a Counter
+  of failures by error type.
+
+  """
+
+  if output_dir and not os.path.isdir(output_dir):
+    os.makedirs(output_dir)
+
+  pool = multiprocessing.Pool(
+    processes or multiprocessing.cpu_count(),
+    initializer=init_worker, initargs=(lemma_file, chunk_db)
+  )
+  users = 0
+  failures = Counter()
+  try:
+    for username, results, error in pool.imap_unordered(process_user, tasks):
+      users += 1
+      if error:
+        failures[error] += 1
+        print >> sys.stderr, "%s: %s" % (username, error)
+      elif output_dir:
+        with open(os.path.join(output_dir, username + ".json"), "w") as f:
+          f.write(results)
+      else:
+        output.write(results + "\n")
+    pool.close()
+    pool.join()
+  finally:
+    pool.terminate()
+    pool.join()
+  return users, failures
+
+def print_cache_stats(cache):
+  print >> sys.stderr, (
+    "Response cache: %(hits)d hits, %(misses)d misses (%(expired)d "
+    "expired), %(evictions)d evictions, %(entries)d entries, "
+    "%(bytes)d bytes, hit rate %(hit_rate).2f"
+  ) % cache.stats()
+
+def process_one(username, cache=None):
+  print "Processing user %s" % username
+  start = datetime.datetime.now()
+  try:
+    u = RedditUser(
+      username, transport=Transport(cache=cache) if cache else None
+    )
+    print u
+  except UserNotFoundError:
+    print "User %s not found" % username
+  except NoDataError:
+    print "No data available for user %s" % username
+
+  print "Processing complete... %s" % (datetime.datetime.now() - start)
+
+def main(argv):
+  try:
+    opts, args = getopt.getopt(argv, "u:s:o:n:p:l:c:r:h")
+  except getopt.GetoptError as e:
+    print >> sys.stderr, e
+    print >> sys.stderr, __doc__
+    return 2
+  opts = dict(opts)
+  cache = ResponseCache(opts["-r"]) if "-r" in opts else None
+
+  if "-u" in opts:
+    tasks = fetch_tasks(opts["-u"], cache)
+  elif "-s" in opts:
+    tasks = snapshot_tasks(opts["-s"])
+  elif len(args) == 1 and "-h" not in opts:
+    init_worker(opts.get("-l"), opts.get("-c"))
+    try:
+      process_one(args[0], cache)
+    finally:
+      if cache:
+        print_cache_stats(cache)
+    return 0
+  else:
+    print >> sys.stderr, __doc__
+    return 2
 
-from reddit_user import RedditUser, UserNotFoundError, NoDataError
+  output = open(opts["-n"], "w") if "-n" in opts else sys.stdout
+  start = datetime.datetime.now()
+  try:
+    users, failures = process_batch(
+      tasks,
+      processes=int(opts["-p"]) if "-p" in opts else None,
+      output_dir=opts.get("-o"),
+      output=output,
+      lemma_file=opts.get("-l"),
+      chunk_db=opts.get("-c")
+    )
+  finally:
+    if output is not sys.stdout:
+      output.close()
 
-print "Processing user %s" % sys.argv[1]
-start = datetime.datetime.now()
-try:
-  u = RedditUser(sys.argv[1])
-  print u
-except UserNotFoundError:
-  print "User %s not found" % sys.argv[1]
-except NoDataError:
-  print "No data available for user %s" % sys.argv[1]
+  elapsed = datetime.datetime.now() - start
+  print >> sys.stderr, "%d users in %s (%.2f users/sec), %d failed" % (
+    users, elapsed, users / (elapsed.total_seconds() or 1),
+    sum(failures.values())
+  )
+  for error, count in failures.most_common():
+    print >> sys.stderr, "  %s: %d" % (error, count)
+  if cache:
+    print_cache_stats(cache)
+  return 0
 
-print "Processing complete... %s" % (datetime.datetime.now() - start)
\ No newline at end of file
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import zlib
+import struct
+from array import array
+
+# Snapshots start with MAGIC followed by a version byte. Version 1 also
+# stored comment permalinks.
+MAGIC = "SHRK"
+VERSION = 2
+
+# Values of the edited column for posts that were never edited, and for
+# posts edited before reddit started recording edit times.
+EDITED_FALSE = 0.0
+EDITED_TRUE = 1.0
+
+class SnapshotError(Exception):
+  pass
+
+class SnapshotWriter(object):
+  """
+  Writes a snapshot as a sequence of frames.
+
+  Each frame holds one column of values - either a typed array of
+  numbers or a block of strings - and is compressed with zlib. Repeated
+  strings (subreddits and domains) are interned into a string table
+  and stored as codes.
+
+  """
+
+  # Frame header: kind of frame, number of values, length of payload
+  FRAME = struct.Struct("<cII")
+
+  def __init__(self):
+    self.frames = []
+    self.table = []
+    self.codes = {}
+
+  def intern(self, s):
+    """
+    Returns code for given string in the string table.
+
+    """
+
+    code = self.codes.get(s)
+    if code is None:
+      code = self.codes[s] = len(self.table)
+      self.table.append(s)
+    return code
+
+  def frame(self, kind, count, payload):
+    payload = zlib.compress(payload)
+    self.frames.append(self.FRAME.pack(kind, count, len(payload)))
+    self.frames.append(payload)
+
+  def array(self, typecode, values):
+    """
+    Writes a column of numbers as an array of given type.
+
+    """
+
+    a = array(typecode, values)
+    if sys.byteorder != "little":
+      a.byteswap()
+    self.frame(typecode, len(a), a.tostring())
+
+  def interned(self, values):
+    """
+    Writes a column of repeated strings as codes into the string table.
+
+    """
+
+    self.array("I", [self.intern(v) for v in values])
+
+  def deltas(self, values):
+    """
+    Writes a column of timestamps, newest first, as the first timestamp
+    followed by differences between successive timestamps - which are
+    small and compress well. If any timestamp has a fractional part,
+    all timestamps are written as they are, with no differences.
+
+    """
+
+    if any(v != int(v) for v in values):
+      self.array("d", values)
+      self.array("i", [])
+      return
+    values = [int(v) for v in values]
+    self.array("d", values[:1])
+    self.array("i", [values[i] - values[i - 1] for i in range(1, len(values))])
+
+  def strings(self, values):
+    """
+    Writes a column of strings as one block of text. Strings are
+    expected to be unicode or ASCII.
+
+    """
+
+    values = [v if isinstance(v, unicode) else unicode(v) for v in values]
+    self.array("I", [len(v) for v in values])
+    self.frame("t", len(values), u"".join(values).encode("utf-8"))
+
+  def getvalue(self):
+    # String table goes first, so that readers have it at hand
+    columns = self.frames
+    self.frames = []
+    self.strings(self.table)
+    table = self.frames
+    self.frames = columns
+    return MAGIC + chr(VERSION) + "".join(table + columns)
+
+
+class SnapshotReader(object):
+  """
+  Reads frames of a snapshot written by SnapshotWriter, in the order
+  they were written, starting with the string table.
+
+  """
+
+  FRAME = SnapshotWriter.FRAME
+
+  def __init__(self, data):
+    if not data.startswith(MAGIC):
+      raise SnapshotError("Not a snapshot")
+    self.version = ord(data[len(MAGIC)])
+    if not 1 <= self.version <= VERSION:
+      raise SnapshotError("Unsupported snapshot version %d" % self.version)
+    self.data = data
+    self.pos = len(MAGIC) + 1
+    self.table = self.strings()
+
+  def frame(self, kind=None):
+    if self.pos + self.FRAME.size > len(self.data):
+      raise SnapshotError("Truncated snapshot")
+    frame_kind, count, length = self.FRAME.unpack_from(self.data, self.pos)
+    if kind and frame_kind != kind:
+      raise SnapshotError("Expected frame %s, got %s" % (kind, frame_kind))
+    start = self.pos + self.FRAME.size
+    self.pos = start + length
+    try:
+      return frame_kind, count, zlib.decompress(self.data[start:self.pos])
+    except zlib.error as e:
+      raise SnapshotError("Corrupt snapshot: %s" % e)
+
+  def array(self, typecode=None):
+    """
+    Reads a column of numbers.
+
+    """
+
+    kind, count, payload = self.frame(typecode)
+    a = array(kind)
+    a.fromstring(payload)
+    if sys.byteorder != "little":
+      a.byteswap()
+    return a
+
+  def interned(self):
+    """
+    Reads a column of interned strings.
+
+    """
+
+    table = self.table
+    return [table[code] for code in self.array("I")]
+
+  def deltas(self):
+    """
+    Reads a column of timestamps written by SnapshotWriter.deltas, as
+    floats.
+
+    """
+
+    values = self.array("d").tolist()
+    deltas = self.array("i")
+    if deltas:
+      value = int(values[0])
+      for delta in deltas:
+        value += delta
+        values.append(float(value))
+    return values
+
+  def strings(self):
+    """
+    Reads a column of strings, as unicode.
+
+    """
+
+    lengths = self.array("I")
+    kind, count, payload = self.frame("t")
+    text = payload.decode("utf-8")
+    values = []
+    start = 0
+    for length in lengths:
+      values.append(text[start:start + length])
+      start += length
+    return values
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import re
+import sre_parse
+from sre_constants import AT, AT_BOUNDARY
+
+class SubstitutionEngine(object):
+  """
+  Applies a list of (pattern, replacement) substitutions to texts, with
+  the same results as applying them one after another with re.sub.
+
+  Consecutive substitutions are merged into passes - one alternation of
+  named groups per pass, with the replacement looked up by the name of
+  the group that matched - so a text is scanned once per pass rather
+  than once per substitution. Runs of patterns that start at a word
+  boundary share one leading \\b, so that they are only tried there.
+
+  A substitution starts a new pass if its pattern shares a word with the
+  pattern or replacement of a substitution already in the pass, as it
+  may then match text that the other one matches or produces (such as
+  "to be honest" after "gotta" becomes "have to"). Substitutions whose
+  patterns or replacements use group references or named groups get a
+  pass of their own, and a pass is also split before its regular
+  expression would have more than MAX_GROUPS groups.
+
+  """
+
+  # Groups a regular expression may have
+  MAX_GROUPS = 99
+
+  def __init__(self, substitutions, flags=re.I):
+    self.flags = flags
+    self.passes = []
+    current = []
+    words = set()
+    groups = 0
+    for pattern, replacement in substitutions:
+      isolated = self.isolated(pattern, replacement)
+      pattern_words = self.words(pattern)
+      # Pattern's groups and the named group around it
+      pattern_groups = re.compile(pattern, flags).groups + 1
+      if current and (
+        isolated or pattern_words & words or
+        groups + pattern_groups > self.MAX_GROUPS
+      ):
+        self.passes.append(self.compile(current))
+        current = []
+        words = set()
+        groups = 0
+      current.append((pattern, replacement))
+      words |= pattern_words | self.words(replacement)
+      groups += pattern_groups
+      if isolated:
+        self.passes.append(self.compile(current))
+        current = []
+        words = set()
+        groups = 0
+    if current:
+      self.passes.append(self.compile(current))
+
+  @staticmethod
+  def isolated(pattern, replacement):
+    """
+    Returns True if given substitution can't be merged with others.
+
+    """
+
+    return "\\" in replacement or "(?" in pattern or \
+      re.search(r"\\\d", pattern) is not None
+
+  @staticmethod
+  def words(s):
+    """
+    Returns set of literal words in a pattern or replacement.
+
+    """
+
+    s = re.sub(r"\\[a-zA-Z]", " ", s)   # Drop \b, \s and such
+    s = re.sub(r"\\(.)", r"\1", s)      # Unescape literals
+    return set(re.findall(r"[^\s|()?*+\[\]{}^$.]+", s.lower()))
+
+  def bounded(self, pattern):
+    """
+    Returns True if pattern only matches at a word boundary.
+
+    """
+
+    parsed = sre_parse.parse(pattern, self.flags)
+    return len(parsed) > 0 and parsed[0] == (AT, AT_BOUNDARY)
+
+  def compile(self, substitutions):
+    """
+    Returns (regex, replacements) for a pass, or (regex, replacement)
+    for a pass of a single substitution.
+
+    """
+
+    if len(substitutions) == 1:
+      pattern, replacement = substitutions[0]
+      return re.compile(pattern, self.flags), replacement
+    replacements = {}
+    # Alternatives, with runs of bounded patterns grouped together
+    alternatives = []
+    run = []
+    for i, (pattern, replacement) in enumerate(substitutions):
+      name = "_%d" % i
+      replacements[name] = replacement
+      group = "(?P<%s>%s)" % (name, pattern)
+      if self.bounded(pattern):
+        run.append(group)
+        continue
+      if run:
+        alternatives.append(r"\b(?:%s)" % "|".join(run))
+        run = []
+      alternatives.append(group)
+    if run:
+      alternatives.append(r"\b(?:%s)" % "|".join(run))
+    return re.compile("|".join(alternatives), self.flags), replacements
+
+  def sub(self, text):
+    for regex, replacement in self.passes:
+      if isinstance(replacement, dict):
+        text = regex.sub(lambda m: replacement[m.lastgroup], text)
+      else:
+        text = regex.sub(replacement, text)
+    return text
+
+
+# Engines by substitution list
+_engines = {}
+
+def compile_substitutions(substitutions, flags=re.I):
+  """
+  Returns a SubstitutionEngine for given substitutions, compiled once
+  and reused for later calls with the same substitutions.
+
+  """
+
+  key = (tuple(substitutions), flags)
+  engine = _engines.get(key)
+  if engine is None:
+    engine = _engines[key] = SubstitutionEngine(substitutions, flags)
+  return engine
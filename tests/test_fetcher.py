@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_reddit import FakeRedditServer
+from fetcher import BatchFetcher
+from response_cache import ResponseCache
+from transport import Transport, TokenBucket
+
+class CountingBucket(TokenBucket):
+  """
+  Token bucket that counts tokens taken.
+
+  """
+
+  def __init__(self, *args, **kwargs):
+    TokenBucket.__init__(self, *args, **kwargs)
+    self.acquired = 0
+
+  def acquire(self):
+    self.acquired += 1
+    TokenBucket.acquire(self)
+
+
+class BatchFetcherTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeRedditServer(synthetic=(150, 20))
+    self.base_url = self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_given_transport_uses_token_bucket(self):
+    transport = Transport(base_url=self.base_url)
+    fetcher = BatchFetcher(
+      workers=4, requests_per_minute=1000000, transport=transport
+    )
+    self.assertTrue(transport.limiter is fetcher.limiter)
+    limiter = fetcher.limiter = transport.limiter = CountingBucket(
+      1000000, per=60.0
+    )
+    usernames = ["user%d" % i for i in range(5)]
+    results = list(fetcher.fetch(usernames))
+    self.assertEqual(
+      sorted(usernames), sorted(username for username, _, _ in results)
+    )
+    self.assertTrue(all(error is None for _, _, error in results))
+    self.assertEqual(self.server.requests, limiter.acquired)
+
+  def test_given_transport_keeps_its_limiter(self):
+    limiter = TokenBucket(1000000, per=60.0)
+    transport = Transport(base_url=self.base_url, limiter=limiter)
+    fetcher = BatchFetcher(transport=transport)
+    self.assertTrue(fetcher.transport.limiter is limiter)
+    self.assertRaises(
+      ValueError, BatchFetcher, requests_per_minute=100, transport=transport
+    )
+
+  def test_given_transport_gets_cache(self):
+    path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, path)
+    cache = ResponseCache(path)
+    transport = Transport(base_url=self.base_url)
+    fetcher = BatchFetcher(transport=transport, cache=cache)
+    self.assertTrue(fetcher.transport.cache is cache)
+    self.assertRaises(
+      ValueError, BatchFetcher, transport=transport, cache=cache
+    )
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_reddit import synthetic_user
+from transport import ListingReader
+
+def listing(
+  posts, kind="t1", after=None, after_first=False, indent=None, utf8=False
+):
+  """
+  Returns a listing page of given posts, as reddit sends it - with text
+  that isn't ASCII escaped, or encoded as UTF-8 if utf8 is True.
+
+  """
+
+  children = [{"kind" : kind, "data" : post} for post in posts]
+  data = [
+    ("modhash", ""), ("dist", len(children)), ("children", children),
+    ("after", after), ("before", None)
+  ]
+  if after_first:
+    data.insert(0, data.pop(3))
+  # Keys in the order given
+  page = u"{%s}" % u", ".join([
+    u'"kind": "Listing"',
+    u'"data": {%s}' % u", ".join(
+      u"%s: %s" % (
+        json.dumps(key),
+        json.dumps(value, indent=indent, ensure_ascii=not utf8)
+      ) for key, value in data
+    )
+  ])
+  return page.encode("utf-8")
+
+
+class SmallBufferReader(ListingReader):
+  """
+  Reader that discards consumed text as soon as it can.
+
+  """
+
+  MAX_CONSUMED = 8
+
+
+class ListingReaderTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    user = synthetic_user("someone", comments=150, submissions=10, seed=1)
+    comments = user["comments"]
+    # Text that isn't ASCII, escapes and nested values, as in real pages
+    comments[0]["body"] = u"caf\xe9 ☃ \U0001F600 \"quoted\" \\ \n"
+    comments[1]["edited"] = 1500000000.25
+    comments[1]["all_awardings"] = [{"count" : 1, "name" : u"\xe9"}]
+    comments[2]["media"] = {"oembed" : None, "score" : -0.5e-3}
+    submissions = user["submissions"]
+
+    cls.small = [
+      listing(comments[:3], after="t1_c2"),
+      listing(comments[:3], after="t1_c2", after_first=True, utf8=True),
+      listing(submissions[:2], kind="t3", after=None, indent=2),
+      listing([]),
+      listing([], after_first=True),
+      json.dumps({"message" : "Not Found", "error" : 404}),
+      '  {"kind" : "Listing" , "data" : { "children" : [ ] } }  ',
+    ]
+    cls.pages = [
+      listing(comments[:100], after="t1_c63", utf8=True),
+      listing(comments[100:], after=None, after_first=True),
+      listing(submissions, kind="t3", indent=1),
+    ]
+
+  def assert_decoded(self, page, chunks, reader_class=ListingReader):
+    expected = json.loads(page)
+    data = expected.get("data", {})
+    reader = reader_class(chunks)
+    self.assertEqual(data.get("children", []), list(reader))
+    self.assertEqual(data.get("after"), reader.after)
+    self.assertEqual(expected.get("error"), reader.error)
+    self.assertEqual(
+      dict((k, v) for k, v in data.items() if k != "children"), reader.data
+    )
+    self.assertEqual(
+      dict((k, v) for k, v in expected.items() if k != "data"), reader.fields
+    )
+
+  def test_whole_pages(self):
+    for page in self.small + self.pages:
+      self.assert_decoded(page, [page])
+
+  def test_split_at_every_offset(self):
+    for page in self.small:
+      for i in range(len(page) + 1):
+        self.assert_decoded(page, [page[:i], page[i:]])
+        self.assert_decoded(page, [page[:i], page[i:]], SmallBufferReader)
+
+  def test_one_byte_chunks(self):
+    for page in self.small + self.pages[:1]:
+      self.assert_decoded(page, list(page))
+
+  def test_random_chunks(self):
+    r = random.Random(1)
+    for page in self.pages:
+      for _ in range(20):
+        chunks = []
+        i = 0
+        while i < len(page):
+          size = r.choice([1, 2, 3, 7, 64, 500, 4096, 16 * 1024])
+          chunks.append(page[i:i + size])
+          # Empty chunks, as iter_content may yield
+          if r.random() < 0.05:
+            chunks.append("")
+          i += size
+        self.assert_decoded(page, chunks)
+        self.assert_decoded(page, chunks, SmallBufferReader)
+
+  def test_compacts_buffer(self):
+    page = listing(
+      synthetic_user("other", comments=1000, submissions=0)["comments"]
+    )
+    self.assertTrue(len(page) > 4 * ListingReader.MAX_CONSUMED)
+    chunks = [page[i:i + 1024] for i in range(0, len(page), 1024)]
+    reader = ListingReader(chunks)
+    for child in reader:
+      self.assertTrue(
+        len(reader.buffer) <= ListingReader.MAX_CONSUMED + 2 * 1024 +
+        len(json.dumps(child))
+      )
+    self.assert_decoded(page, chunks)
+
+  def test_truncated_page(self):
+    page = self.pages[0]
+    for end in (1, len(page) / 2, len(page) - 1):
+      reader = ListingReader([page[:end]])
+      self.assertRaises(ValueError, reader.finish)
+
+  def test_malformed_page(self):
+    for page in ('["children"]', '{"data" : {"children" : [1 2]}}'):
+      self.assertRaises(ValueError, ListingReader([page]).finish)
+
+  def test_close(self):
+    closed = []
+    page = self.pages[0]
+    reader = ListingReader([page], close=lambda: closed.append(True))
+    self.assertEqual("c0", next(iter(reader))["data"]["id"])
+    reader.close()
+    self.assertEqual([True], closed)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import nltk
+
+from fake_reddit import synthetic_user
+from reddit_user import RedditUser, UserData
+
+# NLTK data used when posts are processed
+CORPORA = ("tokenizers/punkt", "corpora/wordnet", "corpora/movie_reviews")
+
+def corpora_installed():
+  for corpus in CORPORA:
+    try:
+      nltk.data.find(corpus)
+    except LookupError:
+      return False
+  return True
+
+
+def user_json(now):
+  """
+  Returns a generated user with posts up to now as JSON, in the format
+  of UserData.to_json.
+
+  """
+
+  data = synthetic_user("someone", 400, 80, seed=1, now=now)
+  # Posts on boundaries of days and of recent metrics, and fractions of
+  # seconds that round up to the next second
+  day = int(now) // 86400 * 86400
+  for i, created_utc in enumerate([
+    now - 1, day, day - 0.0000001, day - 60 * 86400, day - 59 * 86400 - 1,
+    day - 61 * 86400 + 3599.9999996, day - 86400 * 7 + 0.5
+  ]):
+    data["comments"][10 + i]["created_utc"] = created_utc
+    data["submissions"][10 + i]["created_utc"] = created_utc
+  for kind in ("comments", "submissions"):
+    data[kind].sort(key=lambda post: post["created_utc"], reverse=True)
+
+  user = UserData("someone")
+  user.load_json(json.dumps({
+    "about" : data["about"],
+    "comments" : [],
+    "submissions" : []
+  }))
+  user.comments = [UserData.parse_comment(c) for c in data["comments"]]
+  user.submissions = [
+    UserData.parse_submission(s) for s in data["submissions"]
+  ]
+  return user.to_json()
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+@unittest.skipUnless(corpora_installed(), "NLTK corpora are not installed")
+class VectorizedMetricsTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.json_data = user_json(time.time())
+
+  def metrics(self, **kwargs):
+    user = RedditUser("someone", json_data=self.json_data, **kwargs)
+    return json.loads(user.results())["metrics"]
+
+  def test_same_metrics(self):
+    for granularity in RedditUser.GRANULARITIES:
+      for columnar in (False, True):
+        for clip_dates in (False, True):
+          kwargs = {
+            "granularity" : granularity,
+            "columnar" : columnar,
+            "clip_dates" : clip_dates
+          }
+          expected = self.metrics(**kwargs)
+          self.assertTrue(any(expected["recent_posts"]))
+          self.assertEqual(
+            expected, self.metrics(vectorized=True, **kwargs), kwargs
+          )
+
+
+if __name__ == "__main__":
+  unittest.main()
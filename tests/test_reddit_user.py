@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import gc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_reddit import FakeRedditServer
+from reddit_user import UserData
+from transport import Transport
+
+class IncrementalRefreshTest(unittest.TestCase):
+  """
+  Refreshes from a previous snapshot that lacks the newest posts, with
+  and without bounds on retrieval.
+
+  """
+
+  # Posts newer than the previous snapshot
+  NEW = 300
+
+  @classmethod
+  def setUpClass(cls):
+    cls.server = FakeRedditServer(synthetic=(1000, 1000))
+    cls.transport = Transport(base_url=cls.server.start())
+    cls.current = UserData("someone", cls.transport)
+    cls.current.fetch()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.transport.close()
+    gc.collect()
+    cls.server.stop()
+
+  def previous(self, columnar=False, changed=True):
+    """
+    Returns a snapshot of the user taken before the newest posts.
+
+    """
+
+    previous = UserData("someone", columnar=columnar)
+    previous.load_json(self.current.to_json())
+    previous.comments = previous.comments[self.NEW:]
+    previous.submissions = previous.submissions[self.NEW:]
+    if changed:
+      previous.about["comment_karma"] -= 1
+      previous.about["link_karma"] -= 1
+    previous.make_columnar()
+    return previous
+
+  def refresh(self, previous, **bounds):
+    """
+    Refreshes the user from previous. Returns the user and the posts
+    passed to the callback.
+
+    """
+
+    user = UserData("someone", self.transport, **bounds)
+    pages = {"comments" : [], "submissions" : []}
+    user.about = user.get_about()
+    user.fetch_posts(
+      previous=previous,
+      callback=lambda kind, page: pages[kind].extend(page)
+    )
+    return user, pages
+
+  def expected(self, kind, limit=None, since=None):
+    posts = list(getattr(self.current, kind))
+    if since:
+      posts = [p for p in posts if p.created_utc >= since]
+    return [p.id for p in posts[:limit]]
+
+  def assert_refreshed(self, previous, truncated=None, **bounds):
+    user, pages = self.refresh(previous, **bounds)
+    for kind in ("comments", "submissions"):
+      expected = self.expected(
+        kind, bounds.get("limit"), bounds.get("since")
+      )
+      self.assertEqual(expected, [p.id for p in getattr(user, kind)], kind)
+      self.assertEqual(expected, [p.id for p in pages[kind]], kind)
+      self.assertEqual(truncated, user.truncated[kind], kind)
+    return user
+
+  def test_without_bounds(self):
+    for columnar in (False, True):
+      self.assert_refreshed(self.previous(columnar))
+
+  def test_limit_before_previous(self):
+    for columnar in (False, True):
+      self.assert_refreshed(self.previous(columnar), "limit", limit=100)
+
+  def test_limit_within_previous(self):
+    for columnar in (False, True):
+      self.assert_refreshed(self.previous(columnar), "limit", limit=500)
+
+  def test_since_before_previous(self):
+    since = self.current.comments[200].created_utc
+    user, _ = self.refresh(self.previous(), since=since)
+    self.assertEqual(
+      self.expected("comments", since=since), [c.id for c in user.comments]
+    )
+    self.assertEqual("since", user.truncated["comments"])
+    self.assertTrue(all(c.created_utc >= since for c in user.comments))
+
+  def test_since_within_previous(self):
+    since = self.current.comments[600].created_utc
+    user, _ = self.refresh(self.previous(True), since=since)
+    self.assertEqual(
+      self.expected("comments", since=since), [c.id for c in user.comments]
+    )
+    self.assertEqual("since", user.truncated["comments"])
+
+  def test_budget_before_previous(self):
+    user, _ = self.refresh(self.previous(), budget=1e-6)
+    # Only the first page is retrieved, without the posts of previous
+    self.assertEqual(self.expected("comments", limit=100),
+      [c.id for c in user.comments]
+    )
+    self.assertEqual("budget", user.truncated["comments"])
+
+  def test_unchanged_karma(self):
+    previous = self.previous(changed=False)
+    user, _ = self.refresh(previous)
+    self.assertEqual(
+      [c.id for c in previous.comments], [c.id for c in user.comments]
+    )
+    user, pages = self.refresh(previous, limit=50)
+    self.assertEqual(
+      [c.id for c in previous.comments][:50], [c.id for c in user.comments]
+    )
+    self.assertEqual(50, len(pages["comments"]))
+    self.assertEqual("limit", user.truncated["comments"])
+    since = previous.comments[10].created_utc
+    user, _ = self.refresh(previous, since=since)
+    self.assertTrue(all(c.created_utc >= since for c in user.comments))
+    self.assertEqual("since", user.truncated["comments"])
+
+
+if __name__ == "__main__":
+  unittest.main()
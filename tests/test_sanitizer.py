@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sanitizer import TextSanitizer
+
+def sanitize_text(text):
+  """
+  Util.sanitize_text as it was before TextSanitizer, which results must
+  match.
+
+  """
+
+  MAX_WORD_LENGTH = 1024
+
+  _text = " ".join([
+    l for l in text.strip().split("\n") if (
+      not l.strip().startswith("&gt;")
+    )
+  ])
+  substitutions = [
+    (r"\[(.*?)\]\((.*?)\)", r""),   # Remove links from Markdown
+    (r"[\"](.*?)[\"]", r""),    # Remove text within quotes
+    (r" \'(.*?)\ '", r""),      # Remove text within quotes
+    (r"\.+", r". "),        # Remove ellipses
+    (r"\(.*?\)", r""),        # Remove text within round brackets
+    (r"&amp;", r"&"),         # Decode HTML entities
+    (r"http.?:\S+\b", r" ")     # Remove URLs
+  ]
+  for pattern, replacement in substitutions:
+    _text = re.sub(pattern, replacement, _text, flags=re.I)
+
+  # Remove very long words
+  _text = " ".join(
+    [word for word in _text.split(" ") if len(word) <= MAX_WORD_LENGTH]
+  )
+  return _text
+
+
+class TextSanitizerTest(unittest.TestCase):
+
+  # Pieces of texts for random texts
+  ATOMS = [
+    "a", "b", " ", "  ", "\n", "\r", "\t", ".", "..", "...", "[", "]",
+    "(", ")", "\"", "'", " '", "' ", "&", "&amp;", "&AMP;", "&Amp;", "am",
+    "p;", "&gt;", "&GT;", "http", "HTTP", "Http", "s", ":", "://", "ht",
+    "tp", "x.com/y", u"é", u"ü", "word", "-", "_", "x" * 1100, "y" * 1024,
+    "z" * 1025
+  ]
+
+  EDGE_CASES = [
+    "",
+    " ",
+    "\n",
+    "Just a plain comment",
+    "&gt; quoted line\nreply",
+    "  &gt; indented quote\n&gt;another\nreply &gt; not a quote",
+    "&GT; upper case quote",
+    "first line\n\nthird line\r\n",
+    "Wait.. what... really.",
+    "No runs of dots. Just sentences.",
+    "one . two",
+    "he said 'hello there ' and left",
+    "it's 'not closed",
+    "\"quoted\" and \"unclosed",
+    "see [this](http://example.com) link",
+    "[not a link] (but close)",
+    "text (in brackets) and (more",
+    "fish &amp; chips &AMP; peas &amp;amp;",
+    "visit http://example.com/path?q=1 now",
+    "HTTPS://EXAMPLE.COM and https:/broken",
+    "ht(x)tp://joined.com",
+    "&am(x)p; joined",
+    u"caf\xe9 ’quotes’ &amp; \U0001F600",
+    "w" * 1024,
+    "w" * 1025,
+    "short " + "w" * 1025 + " words",
+    "a" * 600 + " " + "b" * 600,
+    "x" * 2000 + ".." + "y" * 10,
+  ]
+
+  def setUp(self):
+    self.sanitizer = TextSanitizer()
+
+  def assert_same(self, text):
+    expected = sanitize_text(text)
+    actual = self.sanitizer.sanitize(text)
+    self.assertEqual(expected, actual, repr(text))
+    self.assertEqual(type(expected), type(actual), repr(text))
+
+  def test_edge_cases(self):
+    for text in self.EDGE_CASES:
+      self.assert_same(text)
+      if isinstance(text, str):
+        self.assert_same(text.decode("utf-8"))
+
+  def test_random_texts(self):
+    r = random.Random(1)
+    for _ in xrange(20000):
+      text = u"".join(
+        r.choice(self.ATOMS) for _ in xrange(r.randint(0, 25))
+      )
+      if r.random() < 0.5 and all(ord(c) < 128 for c in text):
+        text = text.encode("ascii")
+      self.assert_same(text)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_reddit import synthetic_user
+from reddit_user import UserData
+from snapshot import (
+  MAGIC, VERSION, EDITED_FALSE, EDITED_TRUE, SnapshotError, SnapshotReader,
+  SnapshotWriter
+)
+
+def user_json(comments=200, submissions=50):
+  """
+  Returns a generated user as JSON, in the format of UserData.to_json,
+  including edge cases of each field.
+
+  """
+
+  data = synthetic_user("someone", comments, submissions, seed=1)
+  user = UserData("someone")
+  user.load_json(json.dumps({
+    "about" : data["about"],
+    "comments" : [],
+    "submissions" : []
+  }))
+  user.comments = [UserData.parse_comment(c) for c in data["comments"]]
+  user.submissions = [
+    UserData.parse_submission(s) for s in data["submissions"]
+  ]
+  if comments >= 3:
+    first = user.comments[0]
+    first.text = u"caf\xe9 ☃ \U0001F600 \"quoted\"\n\x00"
+    first.edited = True
+    first.score = -(1 << 20)
+    user.comments[1].edited = 1500000000.0
+    user.comments[1].text = u""
+    user.comments[2].gilded = 3
+  if submissions:
+    user.submissions[0].title = "Title"
+    user.submissions[0].text = u"☃" * 1000
+  user.chunks = {"t1_c0" : [["NN", u"caf\xe9"]], "t3_s0" : []}
+  return user.to_json()
+
+
+def version_1_snapshot(user):
+  """
+  Returns user as a version 1 snapshot, which also stored comment
+  permalinks - as empty strings when they could be derived.
+
+  """
+
+  writer = SnapshotWriter()
+  about = json.loads(user.to_json())["about"]
+  writer.strings([json.dumps(about), json.dumps(user.chunks)])
+
+  comments = user.comments
+  writer.strings([c.id for c in comments])
+  writer.interned([c.subreddit for c in comments])
+  writer.strings([c.text for c in comments])
+  writer.deltas([c.created_utc for c in comments])
+  writer.array("i", [c.score for c in comments])
+  writer.array("i", [c.gilded for c in comments])
+  writer.strings([c.submission_id for c in comments])
+  writer.array("d", [
+    EDITED_FALSE if c.edited is False else \
+    EDITED_TRUE if c.edited is True else c.edited \
+      for c in comments
+  ])
+  writer.array("b", [c.top_level for c in comments])
+  writer.strings([
+    "" if i % 2 else c.permalink for i, c in enumerate(comments)
+  ])
+
+  submissions = user.submissions
+  writer.strings([s.id for s in submissions])
+  writer.interned([s.subreddit for s in submissions])
+  writer.strings([s.text for s in submissions])
+  writer.deltas([s.created_utc for s in submissions])
+  writer.array("i", [s.score for s in submissions])
+  writer.array("i", [s.gilded for s in submissions])
+  writer.strings([s.permalink for s in submissions])
+  writer.strings([s.url for s in submissions])
+  writer.strings([s.title for s in submissions])
+  writer.array("b", [s.is_self for s in submissions])
+  writer.interned([s.domain for s in submissions])
+
+  snapshot = writer.getvalue()
+  return snapshot[:len(MAGIC)] + chr(1) + snapshot[len(MAGIC) + 1:]
+
+
+class SnapshotTest(unittest.TestCase):
+
+  def load_json(self, json_data, columnar=False):
+    user = UserData("someone", columnar=columnar)
+    user.load_json(json_data)
+    return user
+
+  def load_snapshot(self, snapshot, columnar=False):
+    user = UserData("someone", columnar=columnar)
+    user.load_snapshot(snapshot)
+    return user
+
+  def assert_round_trip(self, json_data):
+    for columnar in (False, True):
+      snapshot = self.load_json(json_data, columnar).to_snapshot()
+      self.assertTrue(snapshot.startswith(MAGIC + chr(VERSION)))
+      for load_columnar in (False, True):
+        user = self.load_snapshot(snapshot, load_columnar)
+        self.assertEqual(json.loads(json_data), json.loads(user.to_json()))
+
+  def test_round_trip(self):
+    self.assert_round_trip(user_json())
+
+  def test_round_trip_without_posts(self):
+    self.assert_round_trip(user_json(comments=0, submissions=0))
+    self.assert_round_trip(user_json(comments=1, submissions=0))
+    self.assert_round_trip(user_json(comments=0, submissions=1))
+
+  def test_fractional_timestamps(self):
+    data = json.loads(user_json())
+    data["comments"][5]["created_utc"] += 0.25
+    data["submissions"][-1]["created_utc"] -= 0.5
+    self.assert_round_trip(json.dumps(data))
+
+    # Timestamps are only written as they are if there are fractions
+    writer = SnapshotWriter()
+    writer.deltas([3.0, 2.0, 1.0])
+    writer.deltas([3.0, 2.5, 1.0])
+    writer.deltas([])
+    reader = SnapshotReader(writer.getvalue())
+    self.assertEqual([3.0, 2.0, 1.0], reader.deltas())
+    self.assertEqual([3.0, 2.5, 1.0], reader.deltas())
+    self.assertEqual([], reader.deltas())
+
+  def test_version_1(self):
+    expected = self.load_json(user_json())
+    snapshot = version_1_snapshot(expected)
+    self.assertEqual(1, SnapshotReader(snapshot).version)
+    for columnar in (False, True):
+      user = self.load_snapshot(snapshot, columnar)
+      self.assertEqual(
+        json.loads(expected.to_json()), json.loads(user.to_json())
+      )
+
+  def test_bad_magic(self):
+    snapshot = self.load_json(user_json()).to_snapshot()
+    for data in ("", "SHR", "XHRK" + snapshot[4:], user_json()):
+      self.assertRaises(SnapshotError, SnapshotReader, data)
+      self.assertRaises(SnapshotError, self.load_snapshot, data)
+
+  def test_unknown_version(self):
+    snapshot = self.load_json(user_json()).to_snapshot()
+    for version in (0, VERSION + 1, 255):
+      data = MAGIC + chr(version) + snapshot[len(MAGIC) + 1:]
+      self.assertRaises(SnapshotError, SnapshotReader, data)
+      self.assertRaises(SnapshotError, self.load_snapshot, data)
+
+  def test_truncated_snapshot(self):
+    snapshot = self.load_json(user_json()).to_snapshot()
+    for end in (len(MAGIC) + 1, len(snapshot) / 2, len(snapshot) - 1):
+      self.assertRaises(SnapshotError, self.load_snapshot, snapshot[:end])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from substitutions import SubstitutionEngine, compile_substitutions
+from text_parser import TextParser
+
+# Compiled patterns, as lists of substitutions are longer than re's cache
+_compiled = {}
+
+def sequential(substitutions, text):
+  """
+  Applies substitutions one after another, as TextParser.clean_up did
+  before SubstitutionEngine, which results must match.
+
+  """
+
+  for original, rep in substitutions:
+    if original not in _compiled:
+      _compiled[original] = re.compile(original, flags=re.I)
+    text = _compiled[original].sub(rep, text)
+  return text
+
+
+class SubstitutionEngineTest(unittest.TestCase):
+
+  SLANG = [(r"\bslang%d\b" % i, "word%d" % i) for i in range(120)] + \
+    [(r"\b(alt%d|other%d)\b" % (i, i), "same%d" % i) for i in range(60)]
+
+  EDGE_CASES = [
+    "",
+    "I'm gonna say it, tbh I dont like it",
+    "gotta be honest",
+    "gonna be honest, wanna be honest",
+    "IM KINDA SURE BY THE WAY",
+    "in my humble opinion, imho, imo",
+    "I like prefer love",
+    "bf, b/f, gf, g/f",
+    "cant can't &gt; &GT;",
+    "slang1 slang119 alt3 other59 slang",
+    u"caf\xe9, i'd, i'll ’",
+  ]
+
+  def assert_same(self, substitutions, text):
+    engine = compile_substitutions(substitutions)
+    expected = sequential(substitutions, text)
+    actual = engine.sub(text)
+    self.assertEqual(expected, actual, repr(text))
+    self.assertEqual(type(expected), type(actual), repr(text))
+
+  def lists(self):
+    return [
+      TextParser.substitutions,
+      TextParser.corpus_substitutions,
+      TextParser.substitutions + TextParser.corpus_substitutions,
+      TextParser.substitutions + self.SLANG
+    ]
+
+  def test_edge_cases(self):
+    for substitutions in self.lists():
+      for text in self.EDGE_CASES:
+        self.assert_same(substitutions, text)
+
+  def test_random_texts(self):
+    r = random.Random(2)
+    for substitutions in self.lists():
+      # Texts made of the words of the substitutions
+      words = set()
+      for pattern, replacement in substitutions:
+        words |= SubstitutionEngine.words(pattern)
+        words |= SubstitutionEngine.words(replacement)
+      atoms = sorted(words) + [
+        " ", " ", " ", ",", ".", "'", "/", "&", "gt", ";", "x", "I", "M",
+        "BY", "The", "\n"
+      ]
+      for _ in xrange(5000):
+        text = "".join(
+          r.choice(atoms) + r.choice(["", " ", " ", " ", ","])
+          for _ in xrange(r.randint(0, 12))
+        )
+        if r.random() < 0.3:
+          text = text.upper()
+        if r.random() < 0.3:
+          text = text.decode("ascii")
+        self.assert_same(substitutions, text)
+
+  def test_group_limit(self):
+    engine = compile_substitutions(TextParser.substitutions + self.SLANG)
+    for regex, replacement in engine.passes:
+      self.assertTrue(regex.groups <= SubstitutionEngine.MAX_GROUPS)
+
+
+if __name__ == "__main__":
+  unittest.main()
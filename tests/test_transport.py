@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import gc
+import time
+import socket
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from fake_reddit import FakeRedditServer
+from transport import Pacer, RateLimitError, Transport
+
+class CountingPacer(Pacer):
+  """
+  Pacer with short backoffs that counts throttled and successful
+  requests.
+
+  """
+
+  BACKOFF = 0.001
+  JITTER = 0
+
+  def __init__(self, *args, **kwargs):
+    Pacer.__init__(self, *args, **kwargs)
+    self.attempts = []
+    self.successes = 0
+
+  def throttled(self, attempt, retry_after=None):
+    self.attempts.append(attempt)
+    Pacer.throttled(self, attempt, retry_after)
+
+  def succeeded(self, remaining=None, reset=None):
+    self.successes += 1
+    Pacer.succeeded(self, remaining, reset)
+
+
+class PacerTest(unittest.TestCase):
+
+  def test_backoff_doubles(self):
+    pacer = Pacer()
+    pacer.JITTER = 0
+    for attempt in range(3):
+      start = time.time()
+      pacer.next_request = 0
+      pacer.throttled(attempt)
+      self.assertAlmostEqual(
+        pacer.next_request - start, Pacer.BACKOFF * 2 ** attempt, places=1
+      )
+
+  def test_backoff_honors_retry_after(self):
+    pacer = Pacer()
+    start = time.time()
+    pacer.throttled(0, "10")
+    self.assertTrue(pacer.next_request >= start + 10)
+    self.assertTrue(
+      pacer.next_request <= time.time() + 10 * (1 + Pacer.JITTER)
+    )
+    # Retry-After that isn't a number of seconds is ignored
+    pacer = Pacer()
+    start = time.time()
+    pacer.throttled(0, "Wed, 21 Oct 2015 07:28:00 GMT")
+    self.assertTrue(pacer.next_request < start + 10)
+
+  def test_backoff_is_bounded(self):
+    pacer = Pacer(max_delay=5)
+    start = time.time()
+    pacer.throttled(10, "3600")
+    self.assertTrue(pacer.next_request <= start + 5 * (1 + Pacer.JITTER))
+    self.assertTrue(pacer.delay <= 5)
+
+  def test_recovers_after_success(self):
+    pacer = Pacer()
+    pacer.throttled(0)
+    pacer.throttled(1)
+    self.assertEqual(2 * Pacer.BACKOFF, pacer.delay)
+    pacer.succeeded()
+    self.assertEqual(Pacer.BACKOFF, pacer.delay)
+    for _ in range(100):
+      pacer.succeeded()
+    self.assertAlmostEqual(Pacer.MIN_DELAY, pacer.delay)
+
+  def test_spreads_remaining_quota(self):
+    pacer = Pacer()
+    pacer.succeeded("30", "60")
+    self.assertEqual(2, pacer.delay)
+    # Invalid headers are ignored
+    pacer = Pacer()
+    pacer.succeeded("many", "60")
+    self.assertEqual(Pacer.MIN_DELAY, pacer.delay)
+
+  def test_waits_for_reset_when_quota_is_used(self):
+    pacer = Pacer()
+    start = time.time()
+    pacer.succeeded("0", "30")
+    self.assertTrue(pacer.next_request >= start + 30)
+
+  def test_wait_spaces_requests(self):
+    pacer = Pacer(min_delay=0.05)
+    start = time.time()
+    for _ in range(4):
+      pacer.wait()
+    self.assertTrue(time.time() - start >= 0.15)
+
+
+class TransportRetryTest(unittest.TestCase):
+
+  def serve(self, **kwargs):
+    server = FakeRedditServer(synthetic=(10, 5), retry_after=0, **kwargs)
+    self.addCleanup(server.stop)
+    # Let requests that timed out finish before the server stops
+    self.addCleanup(time.sleep, server.latency)
+    return server.start(), server
+
+  def connect(self, base_url, **kwargs):
+    transport = Transport(base_url=base_url, **kwargs)
+    # Connections of requests that timed out are only closed once they
+    # are collected - collect them so that the server's handlers finish
+    self.addCleanup(gc.collect)
+    self.addCleanup(transport.close)
+    return transport
+
+  def test_retries_throttled_requests(self):
+    base_url, server = self.serve(rate_limit_every=2)
+    pacer = CountingPacer()
+    transport = self.connect(base_url, pacer=pacer)
+    for _ in range(5):
+      about = transport.get_json(base_url + "/user/someone/about.json")
+      self.assertEqual("someone", about["data"]["name"])
+    self.assertEqual(5, pacer.successes)
+    self.assertEqual(server.requests, 5 + len(pacer.attempts))
+    self.assertTrue(len(pacer.attempts) >= 4)
+
+  def test_retries_listing_pages(self):
+    base_url, server = self.serve(rate_limit_every=3)
+    transport = self.connect(base_url, pacer=CountingPacer())
+    listing = transport.get_listing(
+      base_url + "/user/someone/comments/.json?limit=100"
+    )
+    self.assertEqual(10, len(list(listing)))
+    self.assertEqual(None, listing.error)
+
+  def test_raises_rate_limit_error_when_throttled(self):
+    base_url, server = self.serve(rate_limit_every=1)
+    pacer = CountingPacer()
+    transport = self.connect(base_url, pacer=pacer, max_retries=3)
+    self.assertRaises(
+      RateLimitError, transport.get_json,
+      base_url + "/user/someone/about.json"
+    )
+    self.assertEqual([0, 1, 2, 3], pacer.attempts)
+    self.assertEqual(4, server.requests)
+
+  def test_raises_connection_error(self):
+    # A port that nothing listens on
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    base_url = "http://127.0.0.1:%d" % s.getsockname()[1]
+    s.close()
+    pacer = CountingPacer()
+    transport = self.connect(base_url, pacer=pacer, max_retries=2)
+    try:
+      transport.get_json(base_url + "/user/someone/about.json")
+    except RateLimitError:
+      self.fail("Connection error reported as rate limited")
+    except requests.ConnectionError:
+      pass
+    else:
+      self.fail("No error raised")
+    self.assertEqual([0, 1, 2], pacer.attempts)
+
+  def test_retries_timeouts(self):
+    base_url, server = self.serve(latency=0.5)
+    pacer = CountingPacer()
+    transport = self.connect(
+      base_url, pacer=pacer, max_retries=2, timeout=0.05
+    )
+    self.assertRaises(
+      requests.Timeout, transport.get_json,
+      base_url + "/user/someone/about.json"
+    )
+    self.assertEqual([0, 1, 2], pacer.attempts)
+
+  def test_recovers_after_timeout(self):
+    base_url, server = self.serve(latency=0.2)
+    pacer = CountingPacer()
+    transport = self.connect(base_url, pacer=pacer, timeout=0.05)
+    url = base_url + "/user/someone/about.json"
+    self.assertRaises(requests.Timeout, transport.get_json, url)
+    transport.timeout = 5
+    self.assertEqual("someone", transport.get_json(url)["data"]["name"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
 
 import re
+import heapq
+import hashlib
+from collections import Counter
 
 from nltk import RegexpParser
 from textblob import TextBlob, Word
 from textblob.taggers import PatternTagger
 from textblob.sentiments import NaiveBayesAnalyzer
 
+from substitutions import compile_substitutions
+from lemma_cache import LemmaCache
+from chunk_cache import ChunkCache
+
 pattern_tagger = PatternTagger()
 naive_bayes_analyzer = NaiveBayesAnalyzer()
 
@@ -88,6 +95,9 @@ stopwords = [
   "yours", "yourself", "yourselves", "z", "zero"
 ]
 
+# For quick lookups
+stopword_set = frozenset(stopwords)
+
 NOUN = "n"
 VERB = "v"
 ADV = "r"
@@ -235,16 +245,36 @@ class TextParser:
 
   chunker = RegexpParser(grammar)
 
+  # Lemmas of words normalized before - may be replaced with a cache
+  # backed by a table on disk
+  lemma_cache = LemmaCache()
+
+  # Version of tagging and chunking, for ChunkCache. Bump CHUNK_VERSION
+  # when the way chunks are processed changes.
+  CHUNK_VERSION = 1
+  chunk_version = "%d:%s:%s" % (
+    CHUNK_VERSION, type(pattern_tagger).__name__,
+    hashlib.sha1(repr((
+      grammar, skip_verbs, skip_prepositions, skip_adjectives
+    ))).hexdigest()
+  )
+
+  # Tags and chunks of sentences seen before - may be replaced with a
+  # cache backed by a database
+  chunk_cache = ChunkCache(chunk_version)
+
   def clean_up(self, text, substitutions):
     """
     Removes unnecessary words from text and replaces common 
     misspellings/contractions with expanded words.
 
+    Substitutions are compiled once per list (see 
+    substitutions.SubstitutionEngine), so extended lists such as 
+    substitutions + custom slang are also applied in a few passes.
+
     """
 
-    for original, rep in substitutions:
-      text = re.sub(original, rep, text, flags=re.I)
-    return text
+    return compile_substitutions(substitutions).sub(text)
 
   def normalize(self, word, tag="N"):
     """
@@ -259,7 +289,11 @@ class TextParser:
       kind = ADV
     elif tag.startswith("J"):
       kind = ADJ
-    return Word(word).lemmatize(kind).lower()
+    lemma = self.lemma_cache.get(word, kind)
+    if lemma is None:
+      lemma = Word(word).lemmatize(kind).lower()
+      self.lemma_cache.set(word, kind, lemma)
+    return lemma
 
   def pet_animal(self, word):
     """
@@ -452,6 +486,55 @@ class TextParser:
     else:
       return None
 
+  def sentence_chunks(self, tags):
+    """
+    Given POS tags of a sentence, extracts and returns useful chunks.
+    
+    """
+
+    chunks = []
+    tree = self.chunker.parse(tags)
+
+    for subtree in tree.subtrees(
+      filter=lambda t: t.label() in ['POSS', 'ACT1', 'ACT2']
+    ):
+      phrase = [(w.lower(), t) for w, t in subtree.leaves()]
+      phrase_type = subtree.label()
+
+      if not any(
+        x in [
+          ("i", "PRP"), ("my", "PRP$")
+        ] for x in [(w, t) for w, t in phrase]
+      ) or (
+        phrase_type in ["ACT1", "ACT2"] and (
+          any(
+            word in self.skip_verbs for word in [
+              w for w, t in phrase if t.startswith("V")
+            ]
+          ) or any(
+            word in self.skip_prepositions for word in [
+              w for w, t in phrase if t == "IN"
+            ]
+          ) or any(
+            word in self.skip_adjectives for word in [
+              w for w, t in phrase if t == "JJ"
+            ]
+          )
+        )
+      ):
+        continue
+
+      if subtree.label() == "POSS":
+        chunk = self.process_possession(subtree)
+        if chunk:
+          chunks.append(chunk)
+      elif subtree.label() in ["ACT1", "ACT2"]:
+        chunk = self.process_action(subtree)
+        if chunk:
+          chunks.append(chunk)
+
+    return chunks
+
   def extract_chunks(self, text):
     """
     Given a block of text, extracts and returns useful chunks.
@@ -466,51 +549,19 @@ class TextParser:
     blob = TextBlob(text, pos_tagger=pattern_tagger, analyzer=naive_bayes_analyzer)
 
     for sentence in blob.sentences:
-      
-      if (not sentence.tags or 
-        not re.search(r"\b(i|my)\b", str(sentence),re.I)
-      ):
-        continue
-
-      tree = self.chunker.parse(sentence.tags)
-
-      for subtree in tree.subtrees(
-        filter=lambda t: t.label() in ['POSS', 'ACT1', 'ACT2']
-      ):
-        phrase = [(w.lower(), t) for w, t in subtree.leaves()]
-        phrase_type = subtree.label()
-
-        if not any(
-          x in [
-            ("i", "PRP"), ("my", "PRP$")
-          ] for x in [(w, t) for w, t in phrase]
-        ) or (
-          phrase_type in ["ACT1", "ACT2"] and (
-            any(
-              word in self.skip_verbs for word in [
-                w for w, t in phrase if t.startswith("V")
-              ]
-            ) or any(
-              word in self.skip_prepositions for word in [
-                w for w, t in phrase if t == "IN"
-              ]
-            ) or any(
-              word in self.skip_adjectives for word in [
-                w for w, t in phrase if t == "JJ"
-              ]
-            )
-          )
+      cached = self.chunk_cache.get(sentence.raw)
+      if cached is not None:
+        tags, sentence_chunks = cached
+      else:
+        tags = sentence.tags
+        if (not tags or 
+          not re.search(r"\b(i|my)\b", str(sentence),re.I)
         ):
-          continue
-
-        if subtree.label() == "POSS":
-          chunk = self.process_possession(subtree)
-          if chunk:
-            chunks.append(chunk)
-        elif subtree.label() in ["ACT1", "ACT2"]:
-          chunk = self.process_action(subtree)
-          if chunk:
-            chunks.append(chunk)
+          sentence_chunks = []
+        else:
+          sentence_chunks = self.sentence_chunks(tags)
+        self.chunk_cache.set(sentence.raw, tags, sentence_chunks)
+      chunks += sentence_chunks
 
     return (chunks, sentiments)
 
@@ -542,6 +593,20 @@ class TextParser:
       )
     ]
 
+  def corpus_words(self, text):
+    """
+    Returns words of a text for corpus statistics - the text is cleaned 
+    up with corpus_substitutions and split into words once, for all of 
+    common words, total and unique word counts.
+    
+    """
+
+    return [
+      unicode(word) for word in TextBlob(
+        self.clean_up(text, self.corpus_substitutions)
+      ).words
+    ]
+
   def total_word_count(self, text):
     """
     Returns total word count of a given text.
@@ -576,3 +641,50 @@ class TextParser:
     """
 
     print TextBlob(sentence).tags
+
+
+class CorpusStats(object):
+  """
+  Word statistics of a corpus that grows one text at a time.
+
+  Each text is split into words once, when it is added (see 
+  TextParser.corpus_words), and only running counts of words are kept - 
+  the corpus itself is never built.
+
+  """
+
+  def __init__(self, parser):
+    self.parser = parser
+    # Number of times each word occurs
+    self.counts = Counter()
+    self.total = 0
+
+  def add(self, text):
+    """
+    Adds a text to the corpus.
+
+    """
+
+    words = self.parser.corpus_words(text)
+    self.total += len(words)
+    self.counts.update(words)
+
+  def total_word_count(self):
+    return self.total
+
+  def unique_word_count(self):
+    return len(self.counts)
+
+  def common_words(self, n):
+    """
+    Returns (word, count) of the n most common words, excluding stop 
+    words and words that aren't alphabetic.
+
+    """
+
+    return heapq.nlargest(
+      n, (
+        (word, count) for word, count in self.counts.iteritems() \
+          if word not in stopword_set and word.isalpha()
+      ), key=lambda x: x[1]
+    )
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import calendar
+
+class ActivityTimeline(object):
+  """
+  Sorted times of a redditor's posts, for finding gaps in activity and
+  sessions of activity.
+
+  Times are integer microseconds since the epoch, rounded the way
+  datetime.fromtimestamp rounds them, so that gaps compare exactly as
+  differences between post datetimes would.
+
+  """
+
+  # Posts less than this many seconds apart belong to the same session
+  SESSION_GAP = 30 * 60
+
+  def __init__(self, times=(), presorted=False):
+    self.times = list(times) if presorted else sorted(times)
+
+  @staticmethod
+  def microseconds(created_utc):
+    """
+    Returns microseconds since the epoch given a UTC timestamp.
+
+    """
+
+    seconds = int(created_utc)
+    return seconds * 1000000 + int(round((created_utc - seconds) * 1e6))
+
+  @staticmethod
+  def datetime_microseconds(dt):
+    """
+    Returns microseconds since the epoch given an aware datetime.
+
+    """
+
+    return calendar.timegm(dt.utctimetuple()) * 1000000 + dt.microsecond
+
+  @classmethod
+  def merge(cls, *timelines):
+    """
+    Returns a timeline with the times of all given timelines.
+
+    """
+
+    return cls(
+      heapq.merge(*[timeline.times for timeline in timelines]),
+      presorted=True
+    )
+
+  def __len__(self):
+    return len(self.times)
+
+  def first(self):
+    return self.times[0] if self.times else None
+
+  def gaps(self, until=None):
+    """
+    Yields (from, to) for each gap between successive posts, and from
+    the last post to until if given.
+
+    """
+
+    times = self.times
+    for i in xrange(1, len(times)):
+      yield times[i - 1], times[i]
+    if until is not None and times:
+      yield times[-1], until
+
+  def longest_gap(self, until=None):
+    """
+    Returns (from, to) of the longest gap - the earliest one if there
+    are several - or None if there are no gaps.
+
+    """
+
+    longest = None
+    longest_length = -1
+    for start, end in self.gaps(until):
+      if end - start > longest_length:
+        longest = (start, end)
+        longest_length = end - start
+    return longest
+
+  def top_gaps(self, k, until=None):
+    """
+    Returns (from, to) of the k longest gaps, longest first.
+
+    """
+
+    return heapq.nlargest(k, self.gaps(until), key=lambda g: g[1] - g[0])
+
+  def median_gap(self):
+    """
+    Returns the median time between successive posts in microseconds,
+    or None if there are fewer than two posts.
+
+    """
+
+    gaps = sorted(end - start for start, end in self.gaps())
+    if not gaps:
+      return None
+    middle = len(gaps) // 2
+    if len(gaps) % 2:
+      return gaps[middle]
+    return (gaps[middle - 1] + gaps[middle]) / 2.0
+
+  def sessions(self, gap=None):
+    """
+    Returns (start, end, posts) of each session - a run of posts where
+    successive posts are less than gap seconds apart.
+
+    """
+
+    gap = (self.SESSION_GAP if gap is None else gap) * 1000000
+    sessions = []
+    start = end = None
+    posts = 0
+    for t in self.times:
+      if start is not None and t - end < gap:
+        end = t
+        posts += 1
+        continue
+      if start is not None:
+        sessions.append((start, end, posts))
+      start = end = t
+      posts = 1
+    if start is not None:
+      sessions.append((start, end, posts))
+    return sessions
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class TokenBucket(object):
+  """
+  Thread-safe token bucket rate limiter.
+
+  Tokens are added at a fixed rate up to a maximum of burst tokens, 
+  and every request has to take a token before it is made.
+
+  """
+
+  def __init__(self, rate, per=60.0, burst=None):
+    # Tokens added per second
+    self.rate = float(rate) / per
+    # Maximum number of tokens the bucket can hold
+    self.burst = float(burst or 1)
+    self.tokens = self.burst
+    self.updated = time.time()
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    """
+    Takes a token from the bucket, blocking until one is available.
+
+    """
+
+    while True:
+      with self.lock:
+        now = time.time()
+        self.tokens = min(
+          self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+
+class RateLimitError(Exception):
+  pass
+
+class Pacer(object):
+  """
+  Adaptive pacing between requests.
+
+  Backs off exponentially (with jitter) when the server throttles us, 
+  honoring Retry-After, and speeds up again after successful requests. 
+  When the server reports its rate limit headers, requests are spread 
+  evenly over the remaining quota so that we never exceed it.
+
+  """
+
+  # Delay in seconds between requests when not throttled
+  MIN_DELAY = 0.0
+  # Upper bound for delays and backoffs
+  MAX_DELAY = 60.0
+  # Backoff for the first retry, doubled on each further retry
+  BACKOFF = 1.0
+  # Fraction of the backoff added as random jitter
+  JITTER = 0.25
+  # Factor applied to the delay after every successful request
+  RECOVERY = 0.5
+
+  def __init__(self, min_delay=None, max_delay=None):
+    self.min_delay = self.MIN_DELAY if min_delay is None else min_delay
+    self.max_delay = max_delay or self.MAX_DELAY
+    self.delay = self.min_delay
+    self.next_request = 0
+    self.lock = threading.Lock()
+
+  def wait(self):
+    """
+    Blocks until the next request may be made.
+
+    """
+
+    with self.lock:
+      now = time.time()
+      start = max(now, self.next_request)
+      self.next_request = start + self.delay
+    if start > now:
+      time.sleep(start - now)
+
+  def throttled(self, attempt, retry_after=None):
+    """
+    Backs off after a throttled (or failed) request.
+
+    """
+
+    backoff = self.BACKOFF * (2 ** attempt)
+    try:
+      backoff = max(backoff, float(retry_after))
+    except (TypeError, ValueError):
+      pass
+    backoff = min(self.max_delay, backoff)
+    backoff += random.uniform(0, backoff * self.JITTER)
+    with self.lock:
+      self.delay = min(self.max_delay, max(self.delay * 2, self.BACKOFF))
+      self.next_request = max(self.next_request, time.time() + backoff)
+
+  def succeeded(self, remaining=None, reset=None):
+    """
+    Speeds up again after a successful request. remaining and reset are 
+    the number of requests left in the current rate limit window and the 
+    seconds until the window resets, if the server reported them.
+
+    """
+
+    with self.lock:
+      self.delay = max(self.min_delay, self.delay * self.RECOVERY)
+      try:
+        remaining = float(remaining)
+        reset = float(reset)
+      except (TypeError, ValueError):
+        return
+      if remaining < 1:
+        self.next_request = max(self.next_request, time.time() + reset)
+      else:
+        self.delay = min(self.max_delay, max(self.delay, reset / remaining))
+
+
+class ListingReader(object):
+  """
+  Incrementally decodes a listing page from chunks of JSON text.
+
+  Iterating over the reader yields the listing's children one at a 
+  time as soon as each of them has been received, so that the page is 
+  never decoded into one big dict. Other fields of the page (such as 
+  after) are available once the children have been read.
+
+  """
+
+  decoder = json.JSONDecoder()
+  WHITESPACE = " \t\n\r"
+  # Consumed text kept in the buffer before it is discarded
+  MAX_CONSUMED = 64 * 1024
+
+  def __init__(self, chunks, close=None):
+    self.chunks = iter(chunks)
+    self.buffer = ""
+    self.pos = 0
+    # Top level fields of the page (kind, or error for error responses)
+    self.fields = {}
+    # Fields of the page's data, other than children
+    self.data = {}
+    self.children = self.parse()
+    self.on_close = close
+
+  def __iter__(self):
+    return self.children
+
+  @property
+  def after(self):
+    self.finish()
+    return self.data.get("after")
+
+  @property
+  def error(self):
+    self.finish()
+    return self.fields.get("error")
+
+  def finish(self):
+    """
+    Reads the rest of the page.
+
+    """
+
+    for child in self.children:
+      pass
+
+  def close(self):
+    """
+    Stops reading the page.
+
+    """
+
+    if self.on_close:
+      self.on_close()
+
+  def fill(self):
+    """
+    Appends the next chunk of text to the buffer.
+
+    """
+
+    for chunk in self.chunks:
+      if chunk:
+        break
+    else:
+      raise ValueError("Unexpected end of listing")
+    if self.pos > self.MAX_CONSUMED:
+      self.buffer = self.buffer[self.pos:]
+      self.pos = 0
+    self.buffer += chunk
+
+  def peek(self):
+    """
+    Skips whitespace and returns the next character.
+
+    """
+
+    while True:
+      while (
+        self.pos < len(self.buffer) and 
+        self.buffer[self.pos] in self.WHITESPACE
+      ):
+        self.pos += 1
+      if self.pos < len(self.buffer):
+        return self.buffer[self.pos]
+      self.fill()
+
+  def expect(self, c):
+    """
+    Skips the next character, which has to be c.
+
+    """
+
+    if self.peek() != c:
+      raise ValueError("Malformed listing: expected %s" % c)
+    self.pos += 1
+
+  def value(self):
+    """
+    Decodes and returns the next JSON value.
+
+    """
+
+    self.peek()
+    while True:
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+      except ValueError:
+        self.fill()
+        continue
+      # A value in a listing is always followed by a comma or a closing 
+      # bracket - if it runs to the end of the buffer, it may have been 
+      # cut short (such as a number split across chunks).
+      if end == len(self.buffer):
+        self.fill()
+        continue
+      self.pos = end
+      return value
+
+  def keys(self):
+    """
+    Yields keys of an object whose opening brace has been read. The 
+    caller must read each key's value before asking for the next key.
+
+    """
+
+    if self.peek() == "}":
+      self.pos += 1
+      return
+    while True:
+      key = self.value()
+      self.expect(":")
+      yield key
+      c = self.peek()
+      self.pos += 1
+      if c == "}":
+        return
+      elif c != ",":
+        raise ValueError("Malformed listing: expected , or }")
+
+  def parse(self):
+    """
+    Yields children of the listing, recording other fields on the way.
+
+    """
+
+    self.expect("{")
+    for key in self.keys():
+      if key != "data" or self.peek() != "{":
+        self.fields[key] = self.value()
+        continue
+      self.pos += 1
+      for data_key in self.keys():
+        if data_key != "children" or self.peek() != "[":
+          self.data[data_key] = self.value()
+          continue
+        self.pos += 1
+        if self.peek() == "]":
+          self.pos += 1
+          continue
+        while True:
+          yield self.value()
+          c = self.peek()
+          self.pos += 1
+          if c == "]":
+            break
+          elif c != ",":
+            raise ValueError("Malformed listing: expected , or ]")
+
+
+class Transport(object):
+  """
+  HTTP transport used to retrieve data from reddit.
+
+  Wraps a pooled requests session so that successive requests to the
+  same host reuse keep-alive connections instead of opening a new
+  connection (and doing a DNS lookup) for every listing page.
+
+  """
+
+  # Where requests are sent - can point to a local stand-in for reddit, 
+  # such as fake_reddit.FakeRedditServer.
+  BASE_URL = "http://www.reddit.com"
+  # Number of per-host connection pools to cache
+  POOL_CONNECTIONS = 4
+  # Maximum number of connections kept alive per host
+  POOL_MAXSIZE = 10
+  # Seconds to wait for the server before giving up on a request
+  TIMEOUT = 30
+  # Number of times a throttled or failed request is retried
+  MAX_RETRIES = 5
+  # Status codes after which a request is retried
+  RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+  # Bytes read at a time when decoding listings
+  CHUNK_SIZE = 16 * 1024
+
+  def __init__(
+    self, headers=None, pool_connections=None, pool_maxsize=None,
+    timeout=None, limiter=None, pacer=None, max_retries=None, cache=None, 
+    base_url=None
+  ):
+    self.base_url = base_url or self.BASE_URL
+    self.timeout = timeout or self.TIMEOUT
+    # Optional rate limiter (such as a TokenBucket) shared by all requests
+    # made through this transport.
+    self.limiter = limiter
+    # Adapts the request rate to the server's rate limits
+    self.pacer = pacer or Pacer()
+    self.max_retries = \
+      self.MAX_RETRIES if max_retries is None else max_retries
+    # Optional response cache (such as a ResponseCache)
+    self.cache = cache
+
+    adapter = HTTPAdapter(
+      pool_connections=pool_connections or self.POOL_CONNECTIONS,
+      pool_maxsize=pool_maxsize or self.POOL_MAXSIZE
+    )
+
+    self.session = requests.Session()
+    self.session.mount("http://", adapter)
+    self.session.mount("https://", adapter)
+    self.session.headers.update({
+      "Accept-Encoding" : "gzip",
+      "Connection" : "keep-alive"
+    })
+    if headers:
+      self.session.headers.update(headers)
+
+  def get(self, url, headers=None, stream=False):
+    """
+    Returns response for given URL.
+
+    """
+
+    if self.limiter:
+      self.limiter.acquire()
+    self.pacer.wait()
+    return self.session.get(
+      url, headers=headers, timeout=self.timeout, stream=stream
+    )
+
+  def request(self, url, headers=None, stream=False):
+    """
+    Returns response for given URL.
+
+    Throttled (429) and failed (5xx) requests are retried for the same 
+    URL after backing off, so that a paginated listing resumes from the 
+    page that failed. Connection errors and timeouts are retried the 
+    same way. If all retries fail, raises RateLimitError if the last 
+    attempt was throttled or failed, or else the last connection error 
+    or timeout.
+
+    """
+
+    error = None
+    for attempt in range(self.max_retries + 1):
+      try:
+        response = self.get(url, headers=headers, stream=stream)
+      except (requests.ConnectionError, requests.Timeout):
+        error = sys.exc_info()
+        self.pacer.throttled(attempt)
+        continue
+      if response.status_code in self.RETRY_STATUS_CODES:
+        error = None
+        response.close()
+        self.pacer.throttled(
+          attempt, response.headers.get("Retry-After")
+        )
+        continue
+      self.pacer.succeeded(
+        response.headers.get("X-Ratelimit-Remaining"),
+        response.headers.get("X-Ratelimit-Reset")
+      )
+      return response
+
+    if error:
+      raise error[0], error[1], error[2]
+    raise RateLimitError(url)
+
+  def get_json(self, url, headers=None):
+    """
+    Returns decoded JSON response for given URL - see request.
+
+    """
+
+    if self.cache:
+      body = self.cache.get(url)
+      if body is not None:
+        return json.loads(body)
+
+    response = self.request(url, headers=headers)
+    if self.cache and response.status_code == 200:
+      self.cache.set(url, response.content)
+    return json.loads(response.content)
+
+  def get_listing(self, url, headers=None):
+    """
+    Returns a ListingReader that decodes the listing page at given URL 
+    while it is being downloaded - see request.
+
+    """
+
+    if self.cache:
+      body = self.cache.get(url)
+      if body is not None:
+        return ListingReader([body])
+
+    response = self.request(url, headers=headers, stream=True)
+    if self.cache and response.status_code == 200:
+      # Whole body is needed for caching anyway
+      self.cache.set(url, response.content)
+      return ListingReader([response.content])
+    return ListingReader(
+      response.iter_content(self.CHUNK_SIZE), close=response.close
+    )
+
+  def close(self):
+    """
+    Closes all pooled connections.
+
+    """
+
+    self.session.close()